@@ -0,0 +1,311 @@
+"""Assertion checks for the parts of rtlib whose behaviour is easy to get subtly wrong.
+
+Run from the repository root:
+
+    python -m bench.checks [NAME ...]
+
+Every ``check_*`` function runs without RT or Matrix and raises
+AssertionError on the first difference; the names of the checks that passed
+are printed.
+"""
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from sqlalchemy import create_engine
+
+from rtlib.database import DatabaseWorker
+from rtlib.errors import RTUnavailable
+from rtlib.metrics import Metrics, command_label
+from rtlib.parser import parse, parse_stream
+from rtlib.scheduler import CircuitBreaker, Scheduler
+from rtlib.watcher import QueueWatch, QueueWatcher, date_formats
+
+
+def check_parser_continuation() -> None:
+    """Multi-line custom fields keep their inner blank lines and extra indentation."""
+    response = parse('RT/4.4.3 200 Ok\n'
+                     '\n'
+                     'id: ticket/7\n'
+                     'CF.{Notes}: first line\n'
+                     '            second line\n'
+                     '\n'
+                     '\n'
+                     '            after two blank lines\n'
+                     '              indented by two\n'
+                     '\n'
+                     'Status: open\n'
+                     'Cc:\n')
+    assert response.ok
+    fields = response.fields
+    assert fields['CF.{Notes}'] == ('first line\nsecond line\n\n\nafter two blank lines\n'
+                                    '  indented by two'), repr(fields['CF.{Notes}'])
+    assert fields['Status'] == 'open'
+    assert fields['Cc'] == ''
+
+
+def check_parser_status() -> None:
+    """A 401 status line is reported, not taken for a field."""
+    response = parse('RT/4.4.3 401 Credentials required\n')
+    assert (response.version, response.status, response.message) == \
+        ('4.4.3', 401, 'Credentials required')
+    assert not response.ok
+    assert response.records == []
+
+
+def check_parser_records() -> None:
+    """``--`` separates the records of a long-format search; comments stay with theirs."""
+    response = parse('RT/4.4.3 200 Ok\n'
+                     '\n'
+                     'id: ticket/1\n'
+                     'Subject: first\n'
+                     '\n'
+                     '--\n'
+                     '\n'
+                     '# a comment\n'
+                     'id: ticket/2\n'
+                     'Subject: second\n'
+                     '--\n')
+    assert [record.fields for record in response.records] == \
+        [{'id': 'ticket/1', 'Subject': 'first'}, {'id': 'ticket/2', 'Subject': 'second'}]
+    assert response.records[1].comments == ['a comment']
+    assert response.comments == ['a comment']
+
+
+entry = ('RT/4.4.3 200 Ok\n'
+         '\n'
+         '# 2/2 (id/31/total)\n'
+         '\n'
+         'id: 31\n'
+         'Content: Hello world\n'
+         '         second line of the mail\n'
+         '         third line of the mail\n'
+         '\n'
+         'Creator: someone\n')
+
+
+def check_parser_content_limit() -> None:
+    """Content is cut at ``content_limit`` characters and the fields after it survive."""
+    fields = parse(entry).fields
+    assert fields['Content'] == 'Hello world\nsecond line of the mail\nthird line of the mail'
+    response = parse(entry, content_limit=20)
+    cut = response.fields['Content']
+    assert len(cut) <= 20 and fields['Content'].startswith(cut), repr(cut)
+    assert response.records[0].truncated == {'Content'}
+    assert response.fields['Creator'] == 'someone'
+    assert parse(entry, content_limit=len(fields['Content']) + 1).records[0].truncated == set()
+
+
+def check_parser_stream() -> None:
+    """Streaming in chunks that split lines and characters parses like the whole text."""
+    text = entry.replace('Hello world', 'Héllo wörld')
+    data = text.encode()
+
+    async def chunks(size: int):
+        for i in range(0, len(data), size):
+            yield data[i:i + size]
+
+    for size in (1, 3, 7, len(data)):
+        for limit in (0, 20):
+            streamed = asyncio.run(parse_stream(chunks(size), limit))
+            assert streamed == parse(text, limit), (size, limit)
+
+
+def rt_date(when: datetime) -> str:
+    return when.strftime(date_formats[0])
+
+
+def watched(status: str, created: datetime, updated: datetime,
+            resolved: datetime = None) -> dict:
+    return {'Status': status, 'Created': rt_date(created), 'LastUpdated': rt_date(updated),
+            'Resolved': rt_date(resolved) if resolved else 'Not set', 'Subject': ''}
+
+
+def check_watch_new() -> None:
+    """The first poll only learns; later polls announce tickets created after it once."""
+    watch = QueueWatch('support', 'Queue = "support"')
+    now = datetime(2026, 10, 16, 12, 0, 0)
+    assert watch.poll_query(1000.0).endswith('LastUpdated > "86400 seconds ago"')
+    assert watch.update({'1': watched('new', now, now)}, 1000.0) == []
+    assert watch.poll_query(1060.0).endswith('LastUpdated > "180 seconds ago"')
+    later = now + timedelta(minutes=1)
+    changes = watch.update({'2': watched('new', later, later),
+                            '1': watched('open', now, later)}, 1060.0)
+    assert [(number, kind) for number, _, kind in changes] == [('2', 'new')]
+    assert watch.update({'2': watched('open', later, later)}, 1120.0) == []
+
+
+def check_watch_new_after_empty_poll() -> None:
+    """After an empty first poll, tickets created in its window are new, older ones are not."""
+    watch = QueueWatch('support', 'Queue = "support"')
+    assert watch.update({}, 100000.0) == []
+    # RT's clock and zone differ from ours; only the ticket's own dates are compared
+    rt_now = datetime(2026, 10, 16, 3, 0, 0)
+    changes = watch.update({'5': watched('new', rt_now - timedelta(hours=2), rt_now),
+                            '6': watched('open', rt_now - timedelta(days=3), rt_now)}, 100600.0)
+    assert [(number, kind) for number, _, kind in changes] == [('5', 'new')]
+
+
+def check_watch_reopened() -> None:
+    """Reopens are recognised from the last seen status and from RT's Resolved date."""
+    watch = QueueWatch('support', 'Queue = "support"')
+    old = datetime(2026, 9, 1, 12, 0, 0)
+    now = datetime(2026, 10, 16, 12, 0, 0)
+    watch.update({'1': watched('resolved', old, now, now), '2': watched('open', old, now)},
+                 1000.0)
+    later = now + timedelta(minutes=1)
+    changes = watch.update({
+        # seen inactive, now active
+        '1': watched('open', old, later, now),
+        # seen active, resolved and reopened between two polls
+        '2': watched('open', old, later, later),
+        # resolved before the watch saw it, then reopened by a reply
+        '3': watched('open', old, later, old + timedelta(days=1)),
+        # never resolved, just updated
+        '4': watched('open', old, later),
+    }, 1060.0)
+    assert [(number, kind) for number, _, kind in changes] == \
+        [('1', 'reopened'), ('2', 'reopened'), ('3', 'reopened')], changes
+    # Nothing is announced twice
+    assert watch.update({'3': watched('open', old, later, old + timedelta(days=1))},
+                        1120.0) == []
+
+
+def check_watch_seen_limit() -> None:
+    """``seen`` forgets the least recently seen tickets first."""
+    watch = QueueWatch('support', 'Queue = "support"', seen_size=2)
+    now = datetime(2026, 10, 16, 12, 0, 0)
+    watch.update({n: watched('open', now, now) for n in ('1', '2', '3')}, 1000.0)
+    assert watch.trim() == ['1']
+    watch.update({'2': watched('open', now, now), '4': watched('open', now, now)}, 1060.0)
+    assert watch.trim() == ['3']
+    assert list(watch.seen) == ['2', '4']
+
+
+def check_watch_restart() -> None:
+    """With a database, a restarted watcher resumes and announces what changed meanwhile."""
+    path = tempfile.mktemp(suffix='.db')
+    log = logging.getLogger('checks')
+    now = datetime.now().replace(microsecond=0)
+    results = [{'1': watched('resolved', now, now, now)},
+               {'2': watched('new', now + timedelta(minutes=5), now + timedelta(minutes=5)),
+                '1': watched('open', now, now + timedelta(minutes=5), now)}]
+    announced = []
+
+    async def search(query: str) -> Dict[str, dict]:
+        return results.pop(0)
+
+    async def announce(watch: QueueWatch, changes: list) -> None:
+        announced.extend((number, kind) for number, _, kind in changes)
+
+    async def run() -> None:
+        for _ in range(2):
+            worker = DatabaseWorker(create_engine(f'sqlite:///{path}'), log)
+            watcher = QueueWatcher(search, announce, log, worker)
+            watcher.configure([{'room': '!room', 'queue': 'support'}], 60, 600)
+            await watcher.loaded
+            watch = watcher.watches['Queue = "support"']
+            watcher._restore(watch)
+            await watcher.poll(watch)
+            # A watch removed from the config is forgotten
+            if not results:
+                watcher.configure([], 60, 600)
+            await worker.close()
+        assert worker.engine.execute('SELECT COUNT(*) FROM queue_watch').scalar() == 0
+
+    try:
+        asyncio.run(run())
+    finally:
+        os.remove(path)
+    assert announced == [('2', 'new'), ('1', 'reopened')], announced
+
+
+def check_breaker() -> None:
+    """The breaker opens after ``threshold`` failures and lets one trial through per cooldown."""
+    now = [0.0]
+    breaker = CircuitBreaker(3, 30, clock=lambda: now[0])
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.failure()
+    assert breaker.allow() and not breaker.open
+    breaker.failure()
+    assert breaker.open and breaker.opened == 1 and not breaker.allow()
+    now[0] = 30
+    assert breaker.allow() and not breaker.allow(), 'only one trial at a time'
+    breaker.failure()
+    assert breaker.opened == 1 and breaker.retry_at == 60 and not breaker.allow()
+    now[0] = 60
+    assert breaker.allow()
+    breaker.cancel()
+    assert breaker.allow(), 'a cancelled trial frees the next one'
+    breaker.success()
+    assert not breaker.open and breaker.allow() and breaker.allow()
+    disabled = CircuitBreaker(0, 30)
+    for _ in range(5):
+        disabled.failure()
+    assert disabled.allow()
+
+
+def check_breaker_priorities() -> None:
+    """Background failures do not lock interactive commands out, and the other way round."""
+    scheduler = Scheduler(Metrics(), retries=0, breaker_threshold=2, breaker_cooldown=60)
+    calls = []
+
+    async def failing() -> None:
+        calls.append('failing')
+        raise OSError('connection refused')
+
+    async def working() -> str:
+        calls.append('working')
+        return 'ok'
+
+    async def refused() -> None:
+        calls.append('refused')
+        raise ValueError('RT answered with an error')
+
+    async def attempt(label: str, request) -> str:
+        command_label.set(label)
+        try:
+            return await scheduler.run('rt', 'show', request)
+        except RTUnavailable as e:
+            return str(e)
+        except ValueError:
+            return 'answered'
+
+    async def run() -> None:
+        assert await attempt('background', failing) == 'RT is unavailable (OSError)'
+        assert await attempt('background', failing) == 'RT is unavailable (OSError)'
+        assert (await attempt('background', working)).startswith('RT is unavailable, trying')
+        assert await attempt('show', working) == 'ok'
+        assert scheduler.stats()['breaker_open'] == 0
+        # An RT error answer proves RT is reachable
+        assert await attempt('show', failing) == 'RT is unavailable (OSError)'
+        assert await attempt('show', refused) == 'answered'
+        assert await attempt('show', failing) == 'RT is unavailable (OSError)'
+        assert await attempt('show', working) == 'ok'
+        for _ in range(2):
+            await attempt('show', failing)
+        assert scheduler.stats()['breaker_open'] == 1
+        assert scheduler.stats()['breaker_opened'] == 2
+
+    asyncio.run(run())
+    assert calls.count('working') == 2 and scheduler.rejected == 1
+
+
+checks: Dict[str, Callable[[], None]] = {name[len('check_'):]: func
+                                         for name, func in list(globals().items())
+                                         if name.startswith('check_')}
+
+
+def main(argv: List[str]) -> None:
+    for name in argv or list(checks):
+        checks[name]()
+        print(f'{name}: ok')
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,111 @@
+"""Just enough of a Matrix client and of maubot's events to drive the RT plugin offline."""
+import asyncio
+from collections import Counter
+from typing import Dict, List, Optional, Union
+
+from mautrix.types import (EventID, EventType, Format, Member, Membership,
+                           MemberStateEventContent, MessageType, ReactionEventContent, RelatesTo,
+                           RelationType, RoomID, TextMessageEventContent, UserID)
+
+
+class FakeClient:
+    """Records what the plugin sends and answers room state from a seeded member list."""
+
+    def __init__(self, mxid: str = '@maubot:example.com', latency: float = 0.0) -> None:
+        self.mxid = UserID(mxid)
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self.members: Dict[RoomID, Dict[UserID, str]] = {}
+        self.events: Dict[EventID, TextMessageEventContent] = {}
+        self.sent: List[TextMessageEventContent] = []
+        self._next = 0
+
+    def add_room(self, room_id: str, members: Dict[str, str]) -> RoomID:
+        self.members[RoomID(room_id)] = {UserID(k): v for k, v in members.items()}
+        return RoomID(room_id)
+
+    def add_event_handler(self, *_) -> None:
+        pass
+
+    def remove_event_handler(self, *_) -> None:
+        pass
+
+    async def _call(self, name: str) -> None:
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    def event_id(self) -> EventID:
+        self._next += 1
+        return EventID(f'$event{self._next}')
+
+    async def get_joined_members(self, room_id: RoomID) -> Dict[UserID, Member]:
+        await self._call('get_joined_members')
+        return {mxid: Member(membership=Membership.JOIN, displayname=name)
+                for mxid, name in self.members[room_id].items()}
+
+    async def get_state_event(self, room_id: RoomID, event_type: EventType,
+                              state_key: str) -> MemberStateEventContent:
+        await self._call('get_state_event')
+        return MemberStateEventContent(membership=Membership.JOIN,
+                                       displayname=self.members[room_id].get(state_key))
+
+    async def send_message(self, room_id: RoomID, content: TextMessageEventContent,
+                           **kwargs) -> EventID:
+        await self._call('send_message')
+        return self._store(content)
+
+    async def send_markdown(self, room_id: RoomID, markdown: str, **kwargs) -> EventID:
+        await self._call('send_message')
+        return self._store(markdown)
+
+    def _store(self, content: Union[str, TextMessageEventContent]) -> EventID:
+        if isinstance(content, str):
+            content = TextMessageEventContent(msgtype=MessageType.NOTICE, body=content,
+                                              format=Format.HTML, formatted_body=content)
+        event_id = self.event_id()
+        self.events[event_id] = content
+        self.sent.append(content)
+        return event_id
+
+
+class FakeMessageEvent:
+    """Stands in for maubot's ``MessageEvent`` in commands and passive handlers."""
+
+    def __init__(self, client: FakeClient, room_id: RoomID, sender: str, body: str,
+                 event_id: Optional[EventID] = None,
+                 content: Optional[TextMessageEventContent] = None) -> None:
+        self.client = client
+        self.room_id = room_id
+        self.sender = UserID(sender)
+        self.event_id = event_id or client.event_id()
+        self.type = EventType.ROOM_MESSAGE
+        self.content = content or TextMessageEventContent(msgtype=MessageType.TEXT, body=body)
+
+    async def mark_read(self) -> None:
+        await self.client._call('mark_read')
+
+    async def respond(self, content: Union[str, TextMessageEventContent], **kwargs) -> EventID:
+        await self.client._call('send_message')
+        return self.client._store(content)
+
+    async def reply(self, content: Union[str, TextMessageEventContent], **kwargs) -> EventID:
+        return await self.respond(content)
+
+    async def react(self, key: str) -> EventID:
+        await self.client._call('send_message')
+        return self.client.event_id()
+
+
+class FakeReactionEvent:
+    """Stands in for a ``ReactionEvent`` annotating one of the bot's messages."""
+
+    def __init__(self, client: FakeClient, room_id: RoomID, sender: str, target: EventID,
+                 key: str) -> None:
+        self.client = client
+        self.room_id = room_id
+        self.sender = UserID(sender)
+        self.event_id = client.event_id()
+        self.type = EventType.REACTION
+        self.content = ReactionEventContent(relates_to=RelatesTo(
+            rel_type=RelationType.ANNOTATION, event_id=target, key=key))
@@ -0,0 +1,516 @@
+"""An in-process stand-in for the RT REST 1.0 and REST 2.0 interfaces.
+
+It serves seeded tickets, histories, searches, edits and comments in the same
+text and JSON formats as RT, with a configurable delay per request, and counts
+every request it answers so benchmarks can report RT load per command.
+"""
+import re
+import base64
+import random
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+status_line = 'RT/4.4.3'
+inactive = {'resolved', 'rejected', 'deleted'}
+date_format = '%a %b %d %H:%M:%S %Y'
+entry_date_format = '%Y-%m-%d %H:%M:%S'
+iso_format = '%Y-%m-%dT%H:%M:%SZ'
+no_content = 'This transaction appears to have no content'
+regex_token = re.compile(r'\s*(\(|\)|\bAND\b|\bOR\b|[\w.{}]+\s*(?:!=|>=|<=|=|>|<|NOT LIKE|LIKE)'
+                         r'\s*(?:"[^"]*"|\'[^\']*\'|\S+))', re.IGNORECASE)
+regex_condition = re.compile(r'([\w.{}]+)\s*(!=|>=|<=|=|>|<|NOT LIKE|LIKE)\s*(.+)', re.IGNORECASE)
+regex_ago = re.compile(r'(\d+) (second|minute|hour|day|week)s? ago')
+fields_order = ['id', 'Queue', 'Owner', 'Creator', 'Subject', 'Status', 'Priority',
+                'InitialPriority', 'FinalPriority', 'Requestors', 'Cc', 'AdminCc', 'Created',
+                'Starts', 'Started', 'Due', 'Resolved', 'Told', 'LastUpdated', 'TimeEstimated',
+                'TimeWorked', 'TimeLeft']
+words = ['printer', 'floor', 'network', 'vpn', 'password', 'reset', 'laptop', 'mail', 'quota',
+         'backup', 'server', 'license', 'account', 'wifi', 'disk', 'cluster', 'login', 'slow',
+         'broken', 'request', 'access', 'share', 'calendar', 'phone', 'monitor', 'update']
+
+
+def form(fields: Dict[str, str]) -> str:
+    lines = []
+    for key, value in fields.items():
+        value = str(value).replace('\n', '\n' + ' ' * (len(key) + 2))
+        lines.append(f'{key}: {value}')
+    return '\n'.join(lines)
+
+
+def describe(kind: str, field: str, old: str, new: str, creator: str) -> str:
+    """RT's brief description of a transaction, as listed by REST 1.0 history."""
+    if kind == 'Create':
+        text = 'Ticket created'
+    elif kind == 'Correspond':
+        text = 'Correspondence added'
+    elif kind == 'Comment':
+        text = 'Comments added'
+    elif kind == 'AddWatcher':
+        text = f'{field} {new} added'
+    else:
+        text = f"{field} changed from '{old}' to '{new}'"
+    return f'{text} by {creator}'
+
+
+def parse_form(content: str) -> Dict[str, str]:
+    fields: Dict[str, str] = {}
+    key = None
+    for line in content.split('\n'):
+        if key and line[:1] == ' ':
+            fields[key] += '\n' + line.strip()
+            continue
+        name, sep, value = line.partition(':')
+        if sep:
+            key = name.strip()
+            fields[key] = value.strip()
+    return fields
+
+
+class Ticket:
+    def __init__(self, number: int, fields: Dict[str, object]) -> None:
+        self.number = number
+        self.fields = fields
+        self.history: List[Dict[str, object]] = []
+
+    def get(self, key: str):
+        if key == 'id':
+            return self.number
+        if key.lower() == 'requestor.emailaddress':
+            key = 'Requestors'
+        return self.fields.get(key, '')
+
+    def render(self, keys: Optional[List[str]] = None) -> Dict[str, str]:
+        rendered = {'id': f'ticket/{self.number}'}
+        for key in keys or fields_order[1:]:
+            value = self.fields.get(key, '')
+            rendered[key] = value.strftime(date_format) if isinstance(value, datetime) else value
+        return rendered
+
+    def render2(self, keys: List[str], expand: Dict[str, str]) -> dict:
+        """The ticket as REST 2.0 JSON with the requested fields and link expansions."""
+        rendered = {'id': self.number, 'type': 'ticket', '_url': f'/REST/2.0/ticket/{self.number}'}
+        for key in keys:
+            value = self.fields.get('Requestors' if key == 'Requestor' else key, '')
+            if key == 'Queue':
+                value = link('queue', value, expand.get(key))
+            elif key in ('Owner', 'Creator'):
+                value = link('user', value, expand.get(key))
+            elif key in ('Requestor', 'Cc', 'AdminCc'):
+                value = [link('user', v, expand.get(key)) for v in value.split(', ') if v]
+            elif key == 'CustomFields':
+                value = []
+            elif isinstance(value, datetime):
+                value = utc(value)
+            elif value == 'Not set':
+                value = '1970-01-01T00:00:00Z'
+            rendered[key] = value
+        return rendered
+
+
+def utc(value: datetime) -> str:
+    """REST 2.0 timestamps are UTC; the seeded local times are in the user's zone."""
+    return value.astimezone(timezone.utc).strftime(iso_format)
+
+
+def link(kind: str, name: str, field: Optional[str]) -> dict:
+    linked = {'type': kind, 'id': name, '_url': f'/REST/2.0/{kind}/{name}'}
+    if field:
+        linked[field] = name
+    return linked
+
+
+class FakeRT:
+    """Seeded RT data plus an aiohttp application serving it."""
+
+    def __init__(self, tickets: int = 200, entries: int = 12, latency: float = 0.0,
+                 user: str = 'maubot', password: str = 'secret', token: str = 'token',
+                 seed: int = 1, now: Optional[datetime] = None) -> None:
+        self.latency = latency
+        self.user = user
+        self.password = password
+        self.token = token
+        self.requests: Counter = Counter()
+        self.sessions = set()
+        self.tickets: Dict[int, Ticket] = {}
+        self.entries: Dict[int, Tuple[Ticket, Dict[str, object]]] = {}
+        self.next_entry = 1
+        self.random = random.Random(seed)
+        now = now or datetime.now().replace(microsecond=0)
+        for number in range(1, tickets + 1):
+            self._seed(number, entries, now)
+        self.runner: Optional[web.AppRunner] = None
+
+    def _seed(self, number: int, entries: int, now: datetime) -> None:
+        created = now - timedelta(hours=self.random.randint(1, 24 * 60))
+        requestor = f'user{self.random.randint(1, 50)}@example.com'
+        subject = ' '.join(self.random.sample(words, 4)).capitalize()
+        status = self.random.choice(['new', 'open', 'open', 'stalled', 'resolved'])
+        owner = self.random.choice(['Nobody', 'Nobody', 'alice', 'bob', 'carol'])
+        ticket = Ticket(number, {
+            'Queue': self.random.choice(['support', 'network', 'accounts']), 'Owner': owner,
+            'Creator': requestor, 'Subject': subject, 'Status': status, 'Priority': 0,
+            'InitialPriority': 0, 'FinalPriority': 0, 'Requestors': requestor, 'Cc': '',
+            'AdminCc': '', 'Created': created, 'Starts': 'Not set', 'Started': 'Not set',
+            'Due': 'Not set', 'Resolved': 'Not set', 'Told': 'Not set', 'LastUpdated': created,
+            'TimeEstimated': 0, 'TimeWorked': 0, 'TimeLeft': 0,
+        })
+        self.tickets[number] = ticket
+        self.add_entry(ticket, 'Create', requestor, self._text(20), when=created)
+        for i in range(1, entries):
+            when = created + timedelta(minutes=i * 7)
+            kind = self.random.choice(['Correspond', 'Comment', 'Status', 'AddWatcher'])
+            if kind == 'Correspond':
+                self.add_entry(ticket, kind, requestor, self._text(40), when=when)
+            elif kind == 'Comment':
+                self.add_entry(ticket, kind, 'alice', self._text(10), when=when)
+            elif kind == 'Status':
+                self.add_entry(ticket, kind, 'alice', field='Status', old='new', new='open',
+                               when=when)
+            else:
+                self.add_entry(ticket, kind, 'alice', field='Requestor', new=requestor,
+                               when=when)
+        if status in inactive:
+            ticket.fields['Resolved'] = ticket.fields['LastUpdated']
+
+    def _text(self, lines: int) -> str:
+        return '\n'.join(' '.join(self.random.choices(words, k=10)) for _ in range(lines))
+
+    def add_entry(self, ticket: Ticket, kind: str, creator: str, content: str = '',
+                  field: str = '', old: str = '', new: str = '',
+                  when: Optional[datetime] = None) -> None:
+        when = when or datetime.now().replace(microsecond=0)
+        entry = {
+            'id': self.next_entry, 'Ticket': ticket.number, 'TimeTaken': 0, 'Type': kind,
+            'Field': field, 'OldValue': old, 'NewValue': new, 'Data': '',
+            'Description': describe(kind, field, old, new, creator),
+            'Content': content or no_content, 'Creator': creator,
+            'Created': when.strftime(entry_date_format), 'Attachments': '',
+        }
+        ticket.history.append(entry)
+        self.entries[self.next_entry] = (ticket, entry)
+        self.next_entry += 1
+        ticket.fields['LastUpdated'] = max(when, ticket.fields['LastUpdated'])
+
+    # -- query evaluation -------------------------------------------------------------------
+
+    def _date(self, value: str) -> Optional[datetime]:
+        match = regex_ago.match(value)
+        if match:
+            unit = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400, 'week': 604800}
+            return datetime.now() - timedelta(seconds=int(match.group(1)) * unit[match.group(2)])
+        for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d', date_format):
+            try:
+                return datetime.strptime(value, fmt)
+            except ValueError:
+                continue
+        return None
+
+    def _condition(self, ticket: Ticket, condition: str) -> bool:
+        key, op, value = regex_condition.match(condition).groups()
+        value = value.strip().strip('"\'')
+        actual = ticket.get(key)
+        op = op.upper()
+        if isinstance(actual, datetime):
+            value = self._date(value)
+            if value is None:
+                return False
+        elif isinstance(actual, int):
+            value = int(value) if value.isdigit() else value
+        else:
+            actual, value = str(actual).lower(), value.lower()
+        if op == '=':
+            return actual == value
+        if op == '!=':
+            return actual != value
+        if op == 'LIKE':
+            return value in actual
+        if op == 'NOT LIKE':
+            return value not in actual
+        try:
+            return {'>': actual > value, '<': actual < value,
+                    '>=': actual >= value, '<=': actual <= value}[op]
+        except TypeError:
+            return False
+
+    def match(self, ticket: Ticket, query: str) -> bool:
+        tokens = [t.strip() for t in regex_token.findall(query)]
+        position = 0
+
+        def expression() -> bool:
+            nonlocal position
+            result = term()
+            while position < len(tokens) and tokens[position].upper() == 'OR':
+                position += 1
+                result = term() or result
+            return result
+
+        def term() -> bool:
+            nonlocal position
+            result = factor()
+            while position < len(tokens) and tokens[position].upper() == 'AND':
+                position += 1
+                result = factor() and result
+            return result
+
+        def factor() -> bool:
+            nonlocal position
+            token = tokens[position]
+            position += 1
+            if token == '(':
+                result = expression()
+                position += 1
+                return result
+            return self._condition(ticket, token)
+
+        return expression() if tokens else True
+
+    # -- HTTP -------------------------------------------------------------------------------
+
+    def respond(self, body: str, status: str = '200 Ok') -> web.Response:
+        return web.Response(text=f'{status_line} {status}\n\n{body}\n',
+                            content_type='text/plain', charset='utf-8')
+
+    async def _authorized(self, request: web.Request) -> bool:
+        if request.path.startswith('/REST/2.0/'):
+            return request.headers.get('Authorization') == f'token {self.token}'
+        if request.cookies.get('RT_SID') in self.sessions:
+            return True
+        data = await request.post() if request.method == 'POST' else request.query
+        return data.get('user') == self.user and data.get('pass') == self.password
+
+    @web.middleware
+    async def middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        kind = request.match_info.route.name or 'other'
+        self.requests[kind] += 1
+        if kind != 'login' and not await self._authorized(request):
+            if request.path.startswith('/REST/2.0/'):
+                return web.json_response({'message': 'Unauthorized'}, status=401)
+            return self.respond('', '401 Credentials required')
+        return await handler(request)
+
+    async def login(self, request: web.Request) -> web.Response:
+        data = await request.post()
+        if data.get('user') != self.user or data.get('pass') != self.password:
+            return self.respond('', '401 Credentials required')
+        session = f'{self.random.getrandbits(64):016x}'
+        self.sessions.add(session)
+        response = self.respond('')
+        response.set_cookie('RT_SID', session)
+        return response
+
+    def _ticket(self, request: web.Request) -> Optional[Ticket]:
+        return self.tickets.get(int(request.match_info['number']))
+
+    async def show(self, request: web.Request) -> web.Response:
+        ticket = self._ticket(request)
+        if ticket is None:
+            return self.respond(f'# Ticket {request.match_info["number"]} does not exist.')
+        return self.respond(form(ticket.render()))
+
+    async def history(self, request: web.Request) -> web.Response:
+        ticket = self._ticket(request)
+        if ticket is None:
+            return self.respond(f'# Ticket {request.match_info["number"]} does not exist.')
+        total = len(ticket.history)
+        lines = [f'{entry["id"]}: {entry["Description"]}' for entry in ticket.history]
+        return self.respond(f'# {total}/{total} (id/{ticket.number}/total)\n\n' + '\n'.join(lines))
+
+    async def entry(self, request: web.Request) -> web.Response:
+        ticket = self._ticket(request)
+        entryid = int(request.match_info['entry'])
+        entry = next((e for e in ticket.history if e['id'] == entryid), None) if ticket else None
+        if entry is None:
+            return self.respond(f'# Transaction {entryid} is not related to this ticket')
+        total = len(ticket.history)
+        return self.respond(f'# {total}/{total} (id/{entryid}/total)\n\n{form(entry)}')
+
+    async def search(self, request: web.Request) -> web.Response:
+        query = request.query.get('query', '')
+        tickets = [t for t in self.tickets.values() if self.match(t, query)]
+        orderby = request.query.get('orderby', '+id')
+        key = orderby.lstrip('+-')
+        tickets.sort(key=lambda t: (str(type(t.get(key))), t.get(key)),
+                     reverse=orderby.startswith('-'))
+        if not tickets:
+            return self.respond('No matching results.')
+        if request.query.get('format') == 'l':
+            fields = request.query.get('fields')
+            keys = [k for k in fields.split(',') if k != 'id'] if fields else None
+            return self.respond('\n\n--\n\n'.join(form(t.render(keys)) for t in tickets))
+        if request.query.get('format') == 'i':
+            return self.respond('\n'.join(f'ticket/{t.number}' for t in tickets))
+        return self.respond('\n'.join(f'{t.number}: {t.fields["Subject"]}' for t in tickets))
+
+    async def edit(self, request: web.Request) -> web.Response:
+        ticket = self._ticket(request)
+        if ticket is None:
+            return self.respond(f'# Ticket {request.match_info["number"]} does not exist.')
+        changes = parse_form((await request.post()).get('content', ''))
+        for key, value in changes.items():
+            if key not in ticket.fields:
+                return self.respond(f'# {key}: Unknown field.', '409 Syntax Error')
+            self._set(ticket, key, value)
+        return self.respond(f'# Ticket {ticket.number} updated.')
+
+    def _set(self, ticket: Ticket, key: str, value: str) -> str:
+        old = ticket.fields[key]
+        ticket.fields[key] = value
+        if key == 'Status' and value in inactive and old not in inactive:
+            # RT keeps the date when the ticket is reopened
+            ticket.fields['Resolved'] = datetime.now().replace(microsecond=0)
+        self.add_entry(ticket, 'Status' if key == 'Status' else 'Set', self.user, field=key,
+                       old=old, new=value)
+        return f"Ticket {ticket.number}: {key} changed from '{old}' to '{value}'"
+
+    async def comment(self, request: web.Request) -> web.Response:
+        ticket = self._ticket(request)
+        if ticket is None:
+            return self.respond(f'# Ticket {request.match_info["number"]} does not exist.')
+        fields = parse_form((await request.post()).get('content', ''))
+        if fields.get('Action', '').lower() == 'correspond':
+            self.add_entry(ticket, 'Correspond', self.user, fields.get('Text', ''))
+            return self.respond('# Correspondence added')
+        self.add_entry(ticket, 'Comment', self.user, fields.get('Text', ''))
+        return self.respond('# Comments added')
+
+    # -- REST 2.0 ---------------------------------------------------------------------------
+
+    @staticmethod
+    def not_found() -> web.Response:
+        return web.json_response({'message': 'Resource does not exist'}, status=404)
+
+    @staticmethod
+    def _requested(request: web.Request) -> Tuple[List[str], Dict[str, str]]:
+        fields = [k for k in request.query.get('fields', '').split(',') if k]
+        expand = {k[7:-1]: v for k, v in request.query.items() if k.startswith('fields[')}
+        return fields, expand
+
+    @staticmethod
+    def page(request: web.Request, items: List[dict]) -> web.Response:
+        per_page = int(request.query.get('per_page', 20))
+        page = int(request.query.get('page', 1))
+        pages = max(1, -(-len(items) // per_page))
+        body = {'count': 0, 'page': page, 'per_page': per_page, 'pages': pages,
+                'total': len(items), 'items': items[(page - 1) * per_page:page * per_page]}
+        body['count'] = len(body['items'])
+        if page < pages:
+            body['next_page'] = f'{request.path}?page={page + 1}'
+        return web.json_response(body)
+
+    async def search2(self, request: web.Request) -> web.Response:
+        query = request.query.get('query', '')
+        tickets = [t for t in self.tickets.values() if self.match(t, query)]
+        key = request.query.get('orderby', 'id')
+        tickets.sort(key=lambda t: (str(type(t.get(key))), t.get(key)),
+                     reverse=request.query.get('order', 'ASC').upper() == 'DESC')
+        fields, expand = self._requested(request)
+        return self.page(request, [t.render2(fields, expand) for t in tickets])
+
+    async def history2(self, request: web.Request) -> web.Response:
+        ticket = self._ticket(request)
+        if ticket is None:
+            return self.not_found()
+        fields, expand = self._requested(request)
+        return self.page(request, [self._transaction(e, fields, expand) for e in ticket.history])
+
+    @staticmethod
+    def _transaction(entry: Dict[str, object], fields: List[str],
+                     expand: Dict[str, str]) -> dict:
+        rendered = {'id': entry['id'], 'type': 'transaction',
+                    '_url': f'/REST/2.0/transaction/{entry["id"]}'}
+        for key in fields or ['Type', 'Field', 'OldValue', 'NewValue', 'Data', 'TimeTaken',
+                              'Creator', 'Created']:
+            value = entry.get(key, '')
+            if key == 'Creator':
+                value = link('user', value, expand.get(key))
+            elif key == 'Created':
+                value = utc(datetime.strptime(value, entry_date_format))
+            rendered[key] = value
+        return rendered
+
+    async def transaction(self, request: web.Request) -> web.Response:
+        found = self.entries.get(int(request.match_info['entry']))
+        if found is None:
+            return self.not_found()
+        ticket, entry = found
+        rendered = self._transaction(entry, [], {})
+        rendered['Object'] = {'type': 'ticket', 'id': str(ticket.number),
+                              '_url': f'/REST/2.0/ticket/{ticket.number}'}
+        return web.json_response(rendered)
+
+    async def attachments(self, request: web.Request) -> web.Response:
+        found = self.entries.get(int(request.match_info['entry']))
+        if found is None:
+            return self.not_found()
+        _, entry = found
+        items = []
+        if entry['Content'] != no_content:
+            content = base64.b64encode(str(entry['Content']).encode()).decode()
+            items.append({'id': entry['id'], 'type': 'attachment', 'ContentType': 'text/plain',
+                          'Content': content})
+        return self.page(request, items)
+
+    async def edit2(self, request: web.Request) -> web.Response:
+        ticket = self._ticket(request)
+        if ticket is None:
+            return self.not_found()
+        changes = await request.json()
+        # Like RT, answer 200 with one message per field, refusals included
+        return web.json_response([self._set(ticket, k, v) if k in ticket.fields
+                                  else f'{k}: Unknown field' for k, v in changes.items()])
+
+    async def comment2(self, request: web.Request) -> web.Response:
+        ticket = self._ticket(request)
+        if ticket is None:
+            return self.not_found()
+        body = await request.json()
+        if request.match_info['action'] == 'correspond':
+            self.add_entry(ticket, 'Correspond', self.user, body.get('Content', ''))
+            return web.json_response(['Correspondence added'], status=201)
+        self.add_entry(ticket, 'Comment', self.user, body.get('Content', ''))
+        return web.json_response(['Comments added'], status=201)
+
+    def app(self) -> web.Application:
+        app = web.Application(middlewares=[self.middleware])
+        rest = '/REST/1.0'
+        app.router.add_post(f'{rest}/', self.login, name='login')
+        app.router.add_get(rf'{rest}/ticket/{{number:\d+}}/show', self.show, name='show')
+        app.router.add_get(rf'{rest}/ticket/{{number:\d+}}/history', self.history,
+                           name='history')
+        app.router.add_get(rf'{rest}/ticket/{{number:\d+}}/history/id/{{entry:\d+}}',
+                           self.entry, name='entry')
+        app.router.add_get(f'{rest}/search/ticket', self.search, name='search')
+        app.router.add_post(rf'{rest}/ticket/{{number:\d+}}/edit', self.edit, name='edit')
+        app.router.add_post(rf'{rest}/ticket/{{number:\d+}}/comment', self.comment,
+                            name='comment')
+        rest2 = '/REST/2.0'
+        app.router.add_get(f'{rest2}/tickets', self.search2, name='rest2:tickets')
+        app.router.add_get(rf'{rest2}/ticket/{{number:\d+}}/history', self.history2,
+                           name='rest2:history')
+        app.router.add_get(rf'{rest2}/transaction/{{entry:\d+}}', self.transaction,
+                           name='rest2:transaction')
+        app.router.add_get(rf'{rest2}/transaction/{{entry:\d+}}/attachments', self.attachments,
+                           name='rest2:attachments')
+        app.router.add_put(rf'{rest2}/ticket/{{number:\d+}}', self.edit2, name='rest2:edit')
+        app.router.add_post(rf'{rest2}/ticket/{{number:\d+}}/{{action:comment|correspond}}',
+                            self.comment2, name='rest2:comment')
+        return app
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """Serve the fake RT and return its base URL (what ``url`` is set to in the config)."""
+        self.runner = web.AppRunner(self.app())
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f'http://{host}:{port}'
+
+    async def stop(self) -> None:
+        if self.runner is not None:
+            await self.runner.cleanup()
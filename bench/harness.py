@@ -0,0 +1,47 @@
+"""Starts the RT plugin against the fake RT server and the fake Matrix client."""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from mautrix.util.config import RecursiveDict
+from ruamel.yaml import YAML
+from ruamel.yaml.comments import CommentedMap
+
+from rt import RT
+from .fake_matrix import FakeClient, FakeMessageEvent, FakeReactionEvent
+
+yaml = YAML()
+base_config = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'base-config.yaml')
+
+
+def make_config(overrides: Optional[dict] = None):
+    with open(base_config) as file:
+        base = RecursiveDict(yaml.load(file), CommentedMap)
+    data = base.clone()._data
+    data.update(overrides or {})
+    return RT.get_config_class()(lambda: data, base.clone, lambda _: None)
+
+
+async def start_plugin(client: FakeClient, overrides: Optional[dict] = None,
+                       database=None) -> RT:
+    plugin = RT(client=client, loop=asyncio.get_event_loop(), http=None,
+                instance_id='bench', log=logging.getLogger('bench'),
+                config=make_config(overrides), database=database, webapp=None,
+                webapp_url=None, loader=None)
+    await plugin.internal_start()
+    return plugin
+
+
+async def command(plugin: RT, evt: FakeMessageEvent) -> None:
+    """Dispatch ``!rt ...`` the way maubot does, including argument parsing."""
+    await plugin.rt(evt)
+
+
+async def passive(plugin: RT, evt: FakeMessageEvent) -> None:
+    await plugin.handler(evt)
+
+
+async def reaction(plugin: RT, evt: FakeReactionEvent) -> None:
+    await asyncio.gather(plugin.react_took(evt), plugin.react_reject(evt))
@@ -0,0 +1,132 @@
+"""Micro-benchmark: rtlib.parser against the regexes rt.py used before it.
+
+Run from the repository root:
+
+    python -m bench.parser_bench [--repeat N]
+
+The fixtures are synthetic RT REST 1.0 responses shaped like the ones our RT
+server returns (same status line, indentation and comment lines), scaled up so
+the differences are measurable.
+"""
+import re
+import sys
+import time
+import asyncio
+import argparse
+import tracemalloc
+from typing import Callable, List, Tuple
+
+from rtlib.parser import parse, parse_stream
+
+regex_properties = re.compile(r'([a-zA-z]+): (.+)')
+regex_history = re.compile(r'([0-9]+): (.+)')
+regex_entry = re.compile(r'([a-zA-z]+): (.+(?:\n {8}.*)*)', re.MULTILINE)
+
+
+def indent(key: str, text: str) -> str:
+    return text.replace('\n', '\n' + ' ' * (len(key) + 2))
+
+
+def fixture_show(fields: int = 2000) -> str:
+    lines = ['RT/4.4.3 200 Ok', '', 'id: ticket/1234', 'Queue: support', 'Owner: Nobody',
+             'Creator: someone@example.com', 'Subject: Printer on floor 3 is on fire',
+             'Status: open', 'Requestors: someone@example.com', 'Cc:',
+             'Created: Mon Oct 12 10:00:00 2026', 'LastUpdated: Tue Oct 13 09:12:22 2026']
+    for i in range(fields):
+        key = f'CF.{{Field {i}}}'
+        value = indent(key, '\n'.join(f'line {j} of field {i}' for j in range(i % 4 + 1)))
+        lines.append(f'{key}: {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def fixture_history(entries: int = 20000) -> str:
+    lines = ['RT/4.4.3 200 Ok', '', f'# {entries}/{entries} (id/1234/total)', '']
+    kinds = ['Ticket created by someone', 'Correspondence added by someone',
+             'Status changed from \'new\' to \'open\' by root', 'Comments added by root']
+    lines += [f'{i}: {kinds[i % len(kinds)]}' for i in range(1, entries + 1)]
+    return '\n'.join(lines) + '\n'
+
+
+def fixture_entry(content_lines: int = 200000) -> str:
+    content = '\n'.join(f'> quoted mail line {i}, lorem ipsum dolor sit amet'
+                        for i in range(content_lines))
+    lines = ['RT/4.4.3 200 Ok', '', '# 2/2 (id/12345/total)', '', 'id: 12345',
+             'Ticket: 1234', 'TimeTaken: 0', 'Type: Correspond', 'Field:', 'OldValue:',
+             'NewValue:', 'Data: No Subject', 'Description: Correspondence added by someone',
+             f'Content: {indent("Content", content)}', '', 'Creator: someone',
+             'Created: 2026-10-13 09:12:22', '', 'Attachments:',
+             '             1: (Unnamed) (text/plain / 9.9M)']
+    return '\n'.join(lines) + '\n'
+
+
+def regex_show(text: str) -> dict:
+    return dict(regex_properties.findall(text))
+
+
+def regex_history_list(text: str) -> dict:
+    return dict(regex_history.findall(text))
+
+
+def regex_entry_content(text: str) -> dict:
+    entry = dict(regex_entry.findall(text))
+    entry['Content'] = entry['Content'].replace('\n' + ' ' * 9, '\n')
+    return entry
+
+
+async def chunks(data: bytes, size: int = 65536):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def stream(content_limit: int = 0) -> Callable[[bytes], dict]:
+    async def fields(data: bytes) -> dict:
+        return (await parse_stream(chunks(data), content_limit)).fields
+
+    def run(data: bytes) -> dict:
+        return asyncio.run(fields(data))
+    return run
+
+
+def measure(func: Callable, arg, repeat: int) -> Tuple[float, int]:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func(arg)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def main(argv: List[str]) -> None:
+    args = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    args.add_argument('--repeat', type=int, default=5)
+    repeat = args.parse_args(argv).repeat
+    cases = [
+        ('show', fixture_show(), regex_show),
+        ('history', fixture_history(), regex_history_list),
+        ('entry', fixture_entry(), regex_entry_content),
+    ]
+    print(f'{"fixture":<10}{"method":<24}{"best ms":>10}{"peak KiB":>12}')
+    for name, text, regex in cases:
+        data = text.encode()
+        runs = [
+            ('regex', regex, text),
+            ('parse', lambda t: parse(t).fields, text),
+            ('parse_stream', stream(), data),
+            ('parse_stream cap=4000', stream(4000), data),
+        ]
+        reference = parse(text).fields
+        for method, func, arg in runs:
+            best, peak = measure(func, arg, repeat)
+            print(f'{name:<10}{method:<24}{best * 1000:>10.2f}{peak / 1024:>12.0f}')
+        if name == 'history':
+            assert reference == regex_history_list(text)
+        if name == 'entry':
+            assert reference['Content'] == regex_entry_content(text)['Content']
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,254 @@
+"""End-to-end benchmark of the RT plugin against a local fake RT and Matrix client.
+
+Run from the repository root:
+
+    python -m bench.run [--iterations N] [--latency MS] [--only show,last]
+                        [--backend rest1|rest2|both]
+
+For every scenario it reports wall-clock latency percentiles, RT requests and
+logins per command and the Matrix messages the bot sent. With ``--backend both``
+each scenario runs against REST 1.0 and REST 2.0 on the same seeded data, and
+the REST 2.0 line says whether the bot answered exactly as with REST 1.0
+(``-`` for ``stats``, which reports each backend's own requests).
+"""
+import re
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Tuple
+
+from ruamel.yaml import YAML
+from sqlalchemy import create_engine
+
+from .fake_rt import FakeRT
+from .fake_matrix import FakeClient, FakeMessageEvent, FakeReactionEvent
+from .harness import command, passive, reaction, start_plugin
+
+alice = '@alice:example.com'
+bob = '@bob:example.com'
+
+
+class Context(NamedTuple):
+    plugin: object
+    client: FakeClient
+    rt: FakeRT
+    room: str
+    tickets: int
+
+    def ticket(self, i: int) -> int:
+        return 1 + i % self.tickets
+
+    def message(self, body: str, sender: str = alice) -> FakeMessageEvent:
+        return FakeMessageEvent(self.client, self.room, sender, body)
+
+    def last_event(self):
+        return list(self.client.events)[-1]
+
+
+Step = Callable[[Context, int], Awaitable[None]]
+
+
+def run_command(body: Callable[[Context, int], str]) -> Step:
+    async def step(ctx: Context, i: int) -> None:
+        await command(ctx.plugin, ctx.message(body(ctx, i)))
+    return step
+
+
+def run_mention(count: int) -> Step:
+    async def step(ctx: Context, i: int) -> None:
+        numbers = ' '.join(f'rt#{ctx.ticket(i * count + n)}' for n in range(count))
+        await passive(ctx.plugin, ctx.message(f'please look at {numbers}'))
+    return step
+
+
+def run_burst(count: int) -> Step:
+    """The same ticket mentioned in ``count`` messages at once, e.g. from bridged rooms."""
+    async def step(ctx: Context, i: int) -> None:
+        await asyncio.gather(*(passive(ctx.plugin, ctx.message(f'rt#{ctx.ticket(i)}'))
+                               for _ in range(count)))
+    return step
+
+
+async def setup_cold(ctx: Context, i: int) -> None:
+    """Evict the ticket that earlier scenarios left in the cache."""
+    ctx.plugin.tickets.evict(str(ctx.ticket(i)))
+
+
+async def setup_mention(ctx: Context, i: int) -> None:
+    await passive(ctx.plugin, ctx.message(f'rt#{ctx.ticket(i)}', bob))
+
+
+async def setup_give(ctx: Context, i: int) -> None:
+    await command(ctx.plugin, ctx.message(f'!rt give {ctx.ticket(i)} Alice', bob))
+
+
+async def setup_listing(ctx: Context, i: int) -> None:
+    await command(ctx.plugin, ctx.message('!rt unsolved'))
+
+
+def run_reaction(key: str, own: bool = True) -> Step:
+    """React to the bot's last message, or with ``own=False`` to somebody else's."""
+    async def step(ctx: Context, i: int) -> None:
+        target = ctx.last_event() if own else ctx.client.event_id()
+        evt = FakeReactionEvent(ctx.client, ctx.room, alice, target, key)
+        await reaction(ctx.plugin, evt)
+    return step
+
+
+def subject_words(ctx: Context, i: int) -> str:
+    return ' '.join(ctx.rt.tickets[ctx.ticket(i)].fields['Subject'].split()[:2])
+
+
+def first_entry(ctx: Context, i: int) -> int:
+    return ctx.rt.tickets[ctx.ticket(i)].history[0]['id']
+
+
+scenarios: Dict[str, tuple] = {
+    'mention': (None, run_mention(1)),
+    'mention x10': (None, run_mention(10)),
+    'burst x5': (setup_cold, run_burst(5)),
+    'react take': (setup_mention, run_reaction('\U0001F44D')),
+    'react reject': (setup_give, run_reaction('\U0001F595')),
+    'react other': (None, run_reaction('\U0001F44D', own=False)),
+    'properties': (None, run_command(lambda c, i: f'!rt properties {c.ticket(i)}')),
+    'resolve': (None, run_command(lambda c, i: f'!rt resolve {c.ticket(i)}')),
+    'resolve x10': (None, run_command(lambda c, i: f'!rt resolve {c.ticket(i * 10)}-'
+                                                   f'{c.ticket(i * 10) + 9}')),
+    'open': (None, run_command(lambda c, i: f'!rt open {c.ticket(i)}')),
+    'stall': (None, run_command(lambda c, i: f'!rt stall {c.ticket(i)}')),
+    'delete': (None, run_command(lambda c, i: f'!rt delete {c.ticket(i)}')),
+    'queue': (None, run_command(lambda c, i: f'!rt queue {c.ticket(i)} support')),
+    'comment': (None, run_command(lambda c, i: f'!rt comment {c.ticket(i)} looking into it')),
+    'reply': (None, run_command(lambda c, i: f'!rt reply {c.ticket(i)} fixed, please retry')),
+    'history': (None, run_command(lambda c, i: f'!rt history {c.ticket(i)}')),
+    'entry': (None, run_command(lambda c, i: f'!rt entry {c.ticket(i)} {first_entry(c, i)}')),
+    'last': (None, run_command(lambda c, i: f'!rt last {c.ticket(i)}')),
+    'show': (None, run_command(lambda c, i: f'!rt show {c.ticket(i)}')),
+    'take': (None, run_command(lambda c, i: f'!rt take {c.ticket(i)}')),
+    'disown': (None, run_command(lambda c, i: f'!rt disown {c.ticket(i)}')),
+    'give': (None, run_command(lambda c, i: f'!rt give {c.ticket(i)} Bob')),
+    'new': (None, run_command(lambda c, i: '!rt new')),
+    'mine': (None, run_command(lambda c, i: '!rt mine')),
+    'unsolved': (None, run_command(lambda c, i: '!rt unsolved')),
+    'more': (setup_listing, run_command(lambda c, i: '!rt more')),
+    'find': (None, run_command(lambda c, i: f'!rt find {subject_words(c, i)}')),
+    'stats': (None, run_command(lambda c, i: '!rt stats')),
+}
+
+
+# Scenarios whose replies report the backend's own request counts
+backend_specific = {'stats'}
+
+regex_volatile = re.compile(r'http://[\w.]+:\d+|\d+\.\d+s|\d{4}-\d\d-\d\d \d\d:\d\d:\d\d|'
+                            r'\w{3} \w{3} \d\d \d\d:\d\d:\d\d \d{4}')
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[int(round(p * (len(ordered) - 1)))] if ordered else 0.0
+
+
+def transcript(client: FakeClient, start: int) -> List[str]:
+    """What the bot sent since ``start``, without ports, timings and timestamps."""
+    bodies = [getattr(content, 'body', content) for content in client.sent[start:]]
+    return [regex_volatile.sub('*', str(body)) for body in bodies]
+
+
+async def benchmark(args: argparse.Namespace, backend: str,
+                    now: datetime) -> Dict[str, Tuple[str, List[str]]]:
+    """Run the scenarios against one backend; returns each one's result line and transcript."""
+    rt = FakeRT(tickets=args.tickets, entries=args.entries, latency=args.latency / 1000,
+                now=now)
+    url = await rt.start()
+    client = FakeClient(latency=args.matrix_latency / 1000)
+    members = {alice: 'Alice', bob: 'Bob'}
+    members.update({f'@user{n}:example.com': f'User {n}' for n in range(args.members)})
+    room = client.add_room('!bench:example.com', members)
+    plugin = await start_plugin(client, {'url': url, 'whitelist': [alice, bob], 'admins': [alice],
+                                         'usermap': {}, 'backend': backend, 'token': rt.token,
+                                         **dict(args.set)},
+                                database=create_engine(args.database))
+    ctx = Context(plugin, client, rt, room, args.tickets)
+    # Let the ticket index build in the background before counting requests
+    while not plugin.index.built:
+        await asyncio.sleep(0.01)
+    names = args.only.split(',') if args.only else list(scenarios)
+    results = {}
+    try:
+        for name in names:
+            setup, step = scenarios[name]
+            latencies = []
+            requests = logins = messages = calls = 0
+            sent = len(client.sent)
+            for i in range(args.iterations):
+                if setup is not None:
+                    await setup(ctx, i)
+                rt_before = sum(rt.requests.values())
+                login_before = rt.requests['login']
+                sent_before = client.calls['send_message']
+                calls_before = sum(client.calls.values())
+                start = time.perf_counter()
+                await step(ctx, i)
+                latencies.append(time.perf_counter() - start)
+                logins += rt.requests['login'] - login_before
+                requests += sum(rt.requests.values()) - rt_before
+                messages += client.calls['send_message'] - sent_before
+                calls += sum(client.calls.values()) - calls_before
+            n = args.iterations
+            line = (f'{name:<14}{backend:<8}{percentile(latencies, .5) * 1000:>9.2f}'
+                    f'{percentile(latencies, .9) * 1000:>9.2f}'
+                    f'{percentile(latencies, .99) * 1000:>9.2f}'
+                    f'{requests / n:>9.2f}{logins / n:>9.2f}{messages / n:>7.2f}'
+                    f'{calls / n:>10.2f}')
+            results[name] = (line, transcript(client, sent))
+    finally:
+        await plugin.internal_stop()
+        await rt.stop()
+    return results
+
+
+async def compare(args: argparse.Namespace) -> None:
+    backends = ['rest1', 'rest2'] if args.backend == 'both' else [args.backend]
+    now = datetime.now().replace(microsecond=0)
+    runs = [await benchmark(args, backend, now) for backend in backends]
+    print(f'{"scenario":<14}{"backend":<8}{"p50 ms":>9}{"p90 ms":>9}{"p99 ms":>9}'
+          f'{"RT req":>9}{"logins":>9}{"msgs":>7}{"mx calls":>10}'
+          + (f'{"same":>6}' if len(runs) > 1 else ''))
+    for name in runs[0]:
+        print(runs[0][name][0])
+        for run in runs[1:]:
+            same = 'yes' if run[name][1] == runs[0][name][1] else 'NO'
+            if name in backend_specific:
+                same = '-'
+            print(f'{run[name][0]}{same:>6}')
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=5.0, help='RT latency in ms')
+    parser.add_argument('--matrix-latency', type=float, default=1.0,
+                        help='homeserver latency in ms')
+    parser.add_argument('--tickets', type=int, default=200)
+    parser.add_argument('--entries', type=int, default=12, help='history entries per ticket')
+    parser.add_argument('--members', type=int, default=50, help='extra room members')
+    parser.add_argument('--only', help='comma separated scenario names')
+    parser.add_argument('--backend', choices=('rest1', 'rest2', 'both'), default='rest1',
+                        help='RT interface the plugin uses')
+    parser.add_argument('--database', default='sqlite://',
+                        help='SQLAlchemy URL of the plugin database')
+    parser.add_argument('--set', nargs=2, action='append', default=[], metavar=('KEY', 'VALUE'),
+                        help='override a plugin config value (YAML scalar)')
+    args = parser.parse_args(argv)
+    args.set = [(key, _scalar(value)) for key, value in args.set]
+    asyncio.run(compare(args))
+
+
+def _scalar(value: str):
+    return YAML(typ='safe').load(value)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,37 +1,86 @@
 import re
-from typing import List, Tuple, Type, Set, Dict
-from mautrix.types import (UserID, RoomID, EventType, TextMessageEventContent, MessageType, Format,
-                           ReactionEvent)
+import hmac
+import html
+import time
+from typing import List, Tuple, Type, Set, Dict, Union, Optional
+from mautrix.types import (UserID, RoomID, EventID, EventType, TextMessageEventContent, MessageType,
+                           Format, ReactionEvent, StateEvent)
 from mautrix.util.config import BaseProxyConfig, ConfigUpdateHelper
 from maubot import Plugin, MessageEvent
-from maubot.handlers import command
+from maubot.handlers import command, event, web
+from aiohttp.web import Request, Response
+from rtlib import (Backend, Rest1Backend, Rest2Backend, RTUnavailable, Scheduler, TTLCache,
+                   DatabaseWorker, HistoryStore, MemberIndex, MessageIndex, QueueWatch,
+                   QueueWatcher, Metrics, SingleFlight, Listing, TicketIndex, gather_bounded,
+                   index_fields, labelled, pack, table)
 
 
 class Config(BaseProxyConfig):
     def do_update(self, helper: ConfigUpdateHelper) -> None:
         helper.copy('prefix')
         helper.copy('url')
+        helper.copy('backend')
         helper.copy('user')
         helper.copy('pass')
+        helper.copy('token')
         helper.copy('whitelist')
+        helper.copy('admins')
+        helper.copy('metrics_token')
         helper.copy('usermap')
         helper.copy('filter_properties')
         helper.copy('filter_entry')
+        helper.copy('cache_size')
+        helper.copy('cache_ttl')
+        helper.copy('concurrency')
+        helper.copy('bulk_limit')
+        helper.copy('rt_concurrency')
+        helper.copy('rt_host_concurrency')
+        helper.copy('rt_timeout')
+        helper.copy('rt_retries')
+        helper.copy('rt_retry_backoff')
+        helper.copy('rt_breaker_threshold')
+        helper.copy('rt_breaker_cooldown')
+        helper.copy('message_size')
+        helper.copy('content_limit')
+        helper.copy('search_orderby')
+        helper.copy('search_limit')
+        helper.copy('listing_rooms')
+        helper.copy('listing_ttl')
+        helper.copy('history_cache_size')
+        helper.copy('history_cache_bytes')
+        helper.copy('message_index_size')
+        helper.copy('index_size')
+        helper.copy('index_interval')
+        helper.copy('watch')
+        helper.copy('watch_interval')
+        helper.copy('watch_interval_max')
 
 
 class RT(Plugin):
     prefix: str
     whitelist: Set[UserID]
+    admins: Set[UserID]
+    metrics_token: str
     usermap: dict
     api: str
-    login: dict
+    backend: Backend = None
+    scheduler: Scheduler
+    tickets: TTLCache = None
+    cursors: TTLCache = None
+    history_store: HistoryStore = None
+    members: MemberIndex
+    worker: DatabaseWorker = None
+    messages: MessageIndex = None
+    index: TicketIndex = None
+    flights: SingleFlight
+    watcher: QueueWatcher
+    metrics: Metrics
     headers = {'User-agent': 'maubot-rt'}
-    regex_ticket = re.compile(r'(?:(?:[rR][tT]#?))([0-9]+)')
+    backends = {'rest1': Rest1Backend, 'rest2': Rest2Backend}
     regex_number = re.compile(r'[0-9]+')
-    regex_properties = re.compile(r'([a-zA-z]+): (.+)')
-    regex_history = re.compile(r'([0-9]+): (.+)')
-    regex_entry = re.compile(r'([a-zA-z]+): (.+(?:\n {8}.*)*)', re.MULTILINE)
-    regex_assigner = re.compile(r'^.*?>(@.+:.+)<.*? assigned')
+    regex_range = re.compile(r'([0-9]+)(?:-([0-9]+))?')
+    search_fields = {'Subject', 'Status', 'Queue', 'Owner', 'Creator', 'Created', 'LastUpdated',
+                     'Resolved'}
     take_this = f'(\U0001F44D this to take the ticket)'
     interesting = [
         'Ticket created',
@@ -40,19 +89,82 @@ class RT(Plugin):
     ]
 
     async def start(self) -> None:
+        self.metrics = Metrics()
+        self.members = MemberIndex(self.client, self.metrics)
+        self.flights = SingleFlight(self.metrics)
+        self.scheduler = Scheduler(self.metrics)
+        if self.database is not None:
+            self.worker = DatabaseWorker(self.database, self.log)
+        self.watcher = QueueWatcher(self._search, self._announce, self.log, self.worker)
         self.on_external_config_update()
 
+    async def stop(self) -> None:
+        await self.watcher.stop()
+        if self.index is not None:
+            await self.index.stop()
+        if self.backend is not None:
+            await self.backend.close()
+        if self.worker is not None:
+            await self.worker.close()
+
     def on_external_config_update(self) -> None:
         self.config.load_and_update()
         self.prefix = self.config['prefix']
         self.whitelist = set(self.config['whitelist'])
+        self.admins = set(self.config['admins'])
+        self.metrics_token = self.config['metrics_token'] or ''
         self.usermap = self.config['usermap']
         self.url = self.config['url']
-        self.rest = f'{self.url}/REST/1.0/'
         self.display = f'{self.url}/Ticket/Display.html'
-        self.login = {'user': self.config['user'], 'pass': self.config['pass']}
+        self.scheduler.configure(self.config['rt_concurrency'], self.config['rt_host_concurrency'],
+                                 self.config['rt_timeout'], self.config['rt_retries'],
+                                 self.config['rt_retry_backoff'],
+                                 self.config['rt_breaker_threshold'],
+                                 self.config['rt_breaker_cooldown'])
+        backend = self.backends[self.config['backend']]
+        if type(self.backend) is not backend:
+            if self.backend is not None:
+                self.loop.create_task(self.backend.close())
+            self.backend = backend(self.headers, self.metrics, self.scheduler)
+        self.backend.configure(self.url, self.config['user'], self.config['pass'],
+                               self.config['token'])
         self.filter_properties = set(self.config['filter_properties'])
         self.filter_entry = set(self.config['filter_entry'])
+        self.concurrency = self.config['concurrency']
+        self.bulk_limit = self.config['bulk_limit']
+        self.message_size = self.config['message_size']
+        self.content_limit = self.config['content_limit']
+        self.search_orderby = self.config['search_orderby']
+        self.search_limit = self.config['search_limit']
+        if self.tickets is None:
+            self.tickets = TTLCache(self.config['cache_size'], self.config['cache_ttl'])
+        else:
+            self.tickets.configure(self.config['cache_size'], self.config['cache_ttl'])
+            self.tickets.clear()
+        if self.cursors is None:
+            self.cursors = TTLCache(self.config['listing_rooms'], self.config['listing_ttl'])
+        else:
+            self.cursors.configure(self.config['listing_rooms'], self.config['listing_ttl'])
+        if self.history_store is None:
+            self.history_store = HistoryStore(self.config['history_cache_size'],
+                                              self.config['history_cache_bytes'])
+        else:
+            self.history_store.configure(self.config['history_cache_size'],
+                                         self.config['history_cache_bytes'])
+            self.history_store.clear()
+        if self.messages is None:
+            self.messages = MessageIndex(self.config['message_index_size'], self.worker)
+        else:
+            self.messages.configure(self.config['message_index_size'])
+        if self.index is None:
+            self.index = TicketIndex(self._index_search, self.log, self.config['index_size'],
+                                     self.config['index_interval'], self.worker)
+        else:
+            self.index.configure(self.config['index_size'], self.config['index_interval'])
+        self.index.start()
+        self.watcher.configure(self.config['watch'] or [], self.config['watch_interval'],
+                               self.config['watch_interval_max'])
+        self.watcher.start()
 
     @classmethod
     def get_config_class(cls) -> Type[BaseProxyConfig]:
@@ -61,14 +173,47 @@ class RT(Plugin):
     def can_manage(self, evt: MessageEvent) -> bool:
         return True if evt.sender in self.whitelist else False
 
+    def can_admin(self, evt: MessageEvent) -> bool:
+        return True if evt.sender in self.admins else False
+
     def map_user(self, username: str) -> str:
         return self.usermap[username] if username in self.usermap else username
 
     def valid_number(self, number: str) -> bool:
         return True if self.regex_number.match(number) else False
 
+    def _numbers(self, spec: str) -> List[str]:
+        """Expand ticket numbers and ranges like ``12 15,1201-1210``.
+
+        Raises ValueError with a message for the user if a part is not a
+        number or range, or if there are more than ``bulk_limit`` tickets.
+        """
+        numbers = []
+        for part in spec.replace(',', ' ').split():
+            match = self.regex_range.fullmatch(part)
+            if not match:
+                raise ValueError(f'**{part}** is not a ticket number or range')
+            first = int(match.group(1))
+            last = int(match.group(2) or first)
+            if last < first:
+                raise ValueError(f'**{part}** is not a valid range')
+            if len(numbers) + last - first >= self.bulk_limit:
+                raise ValueError(f'too many tickets (limit {self.bulk_limit})')
+            numbers += [str(n) for n in range(first, last + 1)]
+        if not numbers:
+            raise ValueError('no ticket numbers given')
+        return list(dict.fromkeys(numbers))
+
+    async def _ticket_numbers(self, evt: MessageEvent, spec: str) -> List[str]:
+        """The tickets of a bulk command, or nothing after telling the user what is wrong."""
+        try:
+            return self._numbers(spec)
+        except ValueError as e:
+            await self._respond(evt, f'hmm... {e} 🤔')
+            return []
+
     def filter_dict(self, raw: dict, keys: Set) -> dict:
-        return {k: v for k, v in raw.items() if k in keys}
+        return {k: v for k, v in raw.items() if k in keys and v}
 
     def markdown_link(self, number: str) -> str:
         return f'[rt#{number}]({self.display}?id={number})'
@@ -76,127 +221,266 @@ class RT(Plugin):
     def html_link(self, number: str) -> str:
         return f'<a href="{self.display}?id={number}">rt#{number}</a>'
 
-    async def _member_mxids(self, room_id: RoomID) -> Dict[UserID, str]:
-        room_members = await self.client.get_joined_members(room_id)
-        member_mxids = {}
-        for mxid in room_members.keys():
-            displayname = await self._displayname(room_id, mxid)
-            member_mxids[displayname] = mxid
-        return member_mxids
-
     async def _displayname(self, room_id: RoomID, user_id: UserID) -> str:
-        event = await self.client.get_state_event(room_id, EventType.ROOM_MEMBER, user_id)
-        return event.displayname
+        return await self.members.displayname(room_id, user_id)
+
+    async def unavailable(self, evt: Union[MessageEvent, ReactionEvent],
+                          error: RTUnavailable) -> None:
+        """Answer a command quickly while the circuit breaker keeps RT requests off."""
+        self.log.warning(f'Could not handle {evt.type} from {evt.sender}: {error}')
+        await self._send(evt.room_id, TextMessageEventContent(msgtype=MessageType.NOTICE,
+                                                              body=f'{error} 🔌'))
+
+    @event.on(EventType.ROOM_MEMBER)
+    async def member_event(self, evt: StateEvent) -> None:
+        self.members.update(evt)
+
+    async def _respond(self, evt: MessageEvent, content: Union[str, TextMessageEventContent],
+                       number: Optional[str] = None,
+                       assigner: Optional[UserID] = None) -> EventID:
+        """Respond and, if the message is about one ticket, index it for reactions."""
+        with self.metrics.time('matrix', 'respond'):
+            event_id = await evt.respond(content)
+        if number is not None:
+            self.messages.add(event_id, evt.room_id, number, assigner)
+        return event_id
+
+    async def _send(self, room_id: RoomID, content: TextMessageEventContent) -> EventID:
+        with self.metrics.time('matrix', 'send_message'):
+            return await self.client.send_message(room_id, content)
+
+    async def _ticket(self, number: str) -> dict:
+        ticket = self.tickets.get(number)
+        if ticket is None:
+            ticket = await self._fresh_ticket(number)
+        return ticket
+
+    async def _fresh_ticket(self, number: str) -> dict:
+        """The ticket as RT has it now, bypassing (and refreshing) the ticket cache."""
+        return await self.flights.do(('show', number), lambda: self.backend.show(number),
+                                     lambda fetched: self._store_ticket(number, fetched))
+
+    def _store_ticket(self, number: str, ticket: dict) -> None:
+        if ticket:
+            self.tickets.put(number, ticket)
 
     async def _properties(self, number: str) -> dict:
-        await self.http.post(self.rest, data=self.login, headers=self.headers)
-        rest = f'{self.rest}ticket/{number}/show'
-        async with self.http.get(rest, headers=self.headers) as response:
-            content = await response.text()
-        raw = dict(self.regex_properties.findall(content))
+        raw = await self._ticket(number)
         return self.filter_dict(raw, self.filter_properties)
 
-    async def _edit(self, number: str, properties: dict) -> None:
-        rest = f'{self.rest}ticket/{number}/edit'
-        content = {'content': '\n'.join([f'{k}: {v}' for k, v in properties.items()])}
-        data = {**self.login, **content}
-        await self.http.post(rest, data=data, headers=self.headers)
+    async def _edit(self, number: str, properties: dict) -> Optional[str]:
+        """Edit a ticket and return RT's error message, or None if it was updated."""
+        error = await self.backend.edit(number, properties)
+        self.tickets.evict(number)
+        self.flights.forget(number)
+        return error
+
+    async def _edit_all(self, evt: MessageEvent, numbers: List[str], properties: dict,
+                        done: str) -> bool:
+        """Apply one edit to every ticket, at most ``concurrency`` at a time.
+
+        Several tickets get one summary reply with the failures; a single ticket
+        only gets a reply here if its edit failed. Returns True when a single
+        edit succeeded and the caller should send its usual reply.
+        """
+        results = await gather_bounded([self._edit(n, properties) for n in numbers],
+                                       self.concurrency)
+        errors = {}
+        for number, result in zip(numbers, results):
+            if isinstance(result, RTUnavailable):
+                result = 'RT is unavailable'
+            elif isinstance(result, Exception):
+                self.log.warning(f'Failed to edit rt#{number}: {result!r}')
+                result = 'could not reach RT'
+            if result is not None:
+                errors[number] = result
+        if len(numbers) == 1 and not errors:
+            return True
+        done_numbers = [n for n in numbers if n not in errors]
+        parts = []
+        if done_numbers:
+            parts.append(f'{len(done_numbers)} of {len(numbers)} tickets {done}: '
+                         + ', '.join(self.markdown_link(n) for n in done_numbers))
+        parts += [f'{self.markdown_link(n)} could not be {done} 😵 {error}'
+                  for n, error in errors.items()]
+        for message in pack(parts, self.message_size, sep='  \n'):
+            await self._respond(evt, message)
+        return False
+
+    def _edit_failed(self, number: str, done: str, error: str) -> TextMessageEventContent:
+        return TextMessageEventContent(
+            msgtype=MessageType.NOTICE, format=Format.HTML,
+            body=f'rt#{number} could not be {done} 😵 {error}',
+            formatted_body=f'{self.html_link(number)} could not be {done} 😵 '
+            f'{html.escape(error)}')
 
     async def _comment(self, number: str, action: str, text: str) -> None:
-        rest = f'{self.rest}ticket/{number}/comment'
-        multiline_text = text.replace('\n', '\n ')
-        content = {'content': f'id: {number}\nAction: {action}\nText: {multiline_text}'}
-        data = {**self.login, **content}
-        await self.http.post(rest, data=data, headers=self.headers)
-
-    async def _history(self, number: str) -> dict:
-        await self.http.post(self.rest, data=self.login, headers=self.headers)
-        rest = f'{self.rest}ticket/{number}/history'
-        async with self.http.get(rest, headers=self.headers) as response:
-            content = await response.text()
-        return dict(self.regex_history.findall(content))
-
-    async def _entry(self, number: str, entry: str) -> dict:
-        await self.http.post(self.rest, data=self.login, headers=self.headers)
-        rest = f'{self.rest}ticket/{number}/history/id/{entry}'
-        async with self.http.get(rest, headers=self.headers) as response:
-            content = await response.text()
-        raw = dict(self.regex_entry.findall(content))
-        entry = self.filter_dict(raw, self.filter_entry)
+        await self.backend.comment(number, action, text)
+        self.tickets.evict(number)
+        self.flights.forget(number)
+
+    async def _history(self, number: str, ticket: Optional[dict] = None) -> dict:
+        """The ticket's history entry list.
+
+        With a fresh ``ticket``, the cached list is used if it was fetched at
+        the ticket's current LastUpdated. Without one the list is fetched, as
+        checking LastUpdated would cost a request too.
+        """
+        updated = ticket.get('LastUpdated') if ticket is not None else None
+        history = self.history_store.cached(number, updated)
+        if history is not None:
+            return history.entries
+        return await self.flights.do(
+            ('history', number), lambda: self.backend.history(number),
+            lambda fetched: self.history_store.ticket(number).merge(fetched, updated))
+
+    async def _entry(self, number: str, entryid: str) -> dict:
+        entry = self.history_store.entry(number, entryid)
+        if entry is not None:
+            return entry
+        return await self.flights.do(('entry', number, entryid),
+                                     lambda: self._fetch_entry(number, entryid),
+                                     lambda fetched: self._store_entry(number, entryid, fetched))
+
+    async def _fetch_entry(self, number: str, entryid: str) -> dict:
+        record = await self.backend.entry(number, entryid, self.content_limit)
+        if record is None:
+            return {}
+        entry = self.filter_dict(record.fields, self.filter_entry)
+        if 'Content' in entry and 'Content' in record.truncated:
+            entry['Content'] = entry['Content'].rstrip() + ' […]'
         if 'Content' in entry and '\n' in entry['Content']:
-            block = '  \n```\n' + entry['Content'].replace('\n' + ' ' * 9, '\n').rstrip() + '\n```'
-            entry['Content'] = block
+            entry['Content'] = '  \n```\n' + entry['Content'].rstrip() + '\n```'
         return entry
 
-    async def _search(self, params: dict) -> dict:
-        rest = f'{self.rest}search/ticket'
-        async with self.http.get(rest, headers=self.headers, params=params) as response:
-            content = await response.text()
-        return dict(self.regex_history.findall(content))
+    def _store_entry(self, number: str, entryid: str, entry: dict) -> None:
+        if entry:
+            self.history_store.put_entry(number, entryid, entry)
+
+    async def _search(self, query: str) -> Dict[str, dict]:
+        # Not cached: rows can predate an edit made during the search, and a
+        # long listing would push the tickets people look at out of the cache
+        fields = sorted(self.filter_properties | self.search_fields)
+        return await self.backend.search(query, fields, self.search_orderby)
+
+    def _listing(self, title: Tuple[str, str], lines: List[Tuple[str, str]],
+                 per_page: int = 0) -> Listing:
+        return Listing(title, lines, (f'`!{self.prefix} more`',
+                                      f'<code>!{self.prefix} more</code>'), per_page)
+
+    async def _index_search(self, query: str) -> Dict[str, dict]:
+        return await self.backend.search(query, index_fields, '+LastUpdated')
+
+    def _ticket_listing(self, title: Tuple[str, str], tickets: Dict[str, dict]) -> Listing:
+        lines = []
+        for number, ticket in tickets.items():
+            subject = ticket.get('Subject', '')
+            details = ' · '.join(ticket.get(k, '?') for k in ('Status', 'Queue', 'Owner'))
+            lines.append((f'{number}: {subject} [{details}]',
+                          f'<code>{number}</code>: <a href="{self.display}?id={number}">'
+                          f'{html.escape(subject)}</a> [{html.escape(details)}]'))
+        return self._listing(title, lines, self.search_limit)
+
+    async def _page(self, evt: MessageEvent, listing: Listing) -> None:
+        """Send the next page of a listing and keep the rest as the room's cursor.
+
+        The cursor holds the rendered lines, so ``!rt more`` needs no RT requests.
+        A new listing replaces the room's cursor.
+        """
+        body, formatted_body = listing.page(self.message_size)
+        if listing.remaining:
+            self.cursors.put(evt.room_id, listing)
+        else:
+            self.cursors.evict(evt.room_id)
+        await self._respond(evt, TextMessageEventContent(
+            msgtype=MessageType.NOTICE, format=Format.HTML,
+            body=body, formatted_body=formatted_body))
+
+    async def _announce(self, watch: QueueWatch, changes: List[Tuple[str, dict, str]]) -> None:
+        lines = [f'{self.markdown_link(number)} {kind} in **{watch.queue}**: '
+                 f'{ticket.get("Subject", "")}' for number, ticket, kind in changes]
+        for message in pack(lines, self.message_size, sep='  \n'):
+            for room_id in watch.rooms:
+                with self.metrics.time('matrix', 'send_message'):
+                    await self.client.send_markdown(room_id, message, msgtype=MessageType.NOTICE)
 
     @command.passive('((^| )([rR][tT]#?))([0-9]+)', multiple=True)
+    @labelled
     async def handler(self, evt: MessageEvent, subs: List[Tuple[str, str]]) -> None:
         await evt.mark_read()
         msg_lines = []
-        await self.http.post(self.rest, data=self.login, headers=self.headers)
-        for sub in subs:
-            number = sub[4]
-            rest = f'{self.rest}ticket/{number}/show'
-            async with self.http.get(rest, headers=self.headers) as response:
-                content = await response.text()
-            ticket = dict(self.regex_properties.findall(content))
+        numbers = list(dict.fromkeys(sub[4] for sub in subs))
+        tickets = await gather_bounded([self._ticket(n) for n in numbers], self.concurrency)
+        for number, ticket in zip(numbers, tickets):
+            if isinstance(ticket, Exception):
+                self.log.warning(f'Failed to fetch rt#{number}: {ticket!r}')
+                msg_lines.append(f'{self.markdown_link(number)} could not be fetched 😵')
+                continue
+            if not ticket:
+                msg_lines.append(f'{self.markdown_link(number)} does not exist 🤷')
+                continue
             markdown = '{} is **{}** in **{}** from {}  \n{}'.format(
                 self.markdown_link(number),
-                ticket['Status'],
-                ticket['Queue'],
-                ticket['Creator'],
-                ticket['Subject']
+                ticket.get('Status', '?'),
+                ticket.get('Queue', '?'),
+                ticket.get('Creator', '?'),
+                ticket.get('Subject', '')
             )
             msg_lines.append(markdown)
         if msg_lines:
-            if len(msg_lines) == 1:
+            single = None
+            if len(numbers) == 1 and tickets[0] and not isinstance(tickets[0], Exception):
                 msg_lines += [self.take_this]
-            await evt.respond('\n\n'.join(msg_lines))
+                single = numbers[0]
+            await self._respond(evt, '\n\n'.join(msg_lines), single)
 
     @command.passive(regex=r"(?:\U0001F44D[\U0001F3FB-\U0001F3FF]?)",
                      field=lambda evt: evt.content.relates_to.key,
                      event_type=EventType.REACTION, msgtypes=None)
+    @labelled
     async def react_took(self, evt: ReactionEvent, _: Tuple[str]) -> None:
+        target = self.messages.get(evt.content.relates_to.event_id)
+        if target is None or target.room_id != evt.room_id:
+            return
+        number = target.number
         username = evt.sender[1:].split(':')[0]
         displayname = await self._displayname(evt.room_id, evt.sender)
-        target_evt = await self.client.get_event(evt.room_id, evt.content.relates_to.event_id)
-        target_ticket = self.regex_ticket.findall(target_evt.content.body)
-        if len(target_ticket) == 1:
-            number = target_ticket[0]
-            await self._edit(number, {'Owner': self.map_user(username)})
-            content = TextMessageEventContent(
-                msgtype=MessageType.NOTICE, format=Format.HTML,
-                body=f'{displayname} took {number}',
-                formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
-                f'took <code>{number}</code>')
-            await self.client.send_message(evt.room_id, content)
+        error = await self._edit(number, {'Owner': self.map_user(username)})
+        if error is not None:
+            await self._send(evt.room_id, self._edit_failed(number, 'taken', error))
+            return
+        content = TextMessageEventContent(
+            msgtype=MessageType.NOTICE, format=Format.HTML,
+            body=f'{displayname} took {number}',
+            formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
+            f'took <code>{number}</code>')
+        await self._send(evt.room_id, content)
 
     @command.passive(regex=r"(?:\U0001F595[\U0001F3FB-\U0001F3FF]?)",
                      field=lambda evt: evt.content.relates_to.key,
                      event_type=EventType.REACTION, msgtypes=None)
+    @labelled
     async def react_reject(self, evt: ReactionEvent, _: Tuple[str]) -> None:
+        target = self.messages.get(evt.content.relates_to.event_id)
+        if target is None or target.room_id != evt.room_id or target.assigner is None:
+            return
+        number = target.number
+        target_mxid = target.assigner
         displayname = await self._displayname(evt.room_id, evt.sender)
-        target_evt = await self.client.get_event(evt.room_id, evt.content.relates_to.event_id)
-        target_ticket = self.regex_ticket.findall(target_evt.content.body)
-        target_mxid = self.regex_assigner.findall(target_evt.content.formatted_body)[0]
         target_username = target_mxid[1:].split(':')[0]
         target_displayname = await self._displayname(evt.room_id, target_mxid)
-        if len(target_ticket) == 1:
-            number = target_ticket[0]
-            await self._edit(number, {'Owner': self.map_user(target_username)})
-            content = TextMessageEventContent(
-                msgtype=MessageType.NOTICE, format=Format.HTML,
-                body=f'{displayname} politely rejected {number} and gave it back to '
-                     f'{target_displayname}',
-                formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
-                f'politely rejected <code>{number}</code> and gave it back to '
-                f'<a href="https://matrix.to/#/{target_mxid}">{target_mxid}</a>')
-            await self.client.send_message(evt.room_id, content)
+        error = await self._edit(number, {'Owner': self.map_user(target_username)})
+        if error is not None:
+            await self._send(evt.room_id, self._edit_failed(number, 'given back', error))
+            return
+        content = TextMessageEventContent(
+            msgtype=MessageType.NOTICE, format=Format.HTML,
+            body=f'{displayname} politely rejected {number} and gave it back to '
+                 f'{target_displayname}',
+            formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
+            f'politely rejected <code>{number}</code> and gave it back to '
+            f'<a href="https://matrix.to/#/{target_mxid}">{target_mxid}</a>')
+        await self._send(evt.room_id, content)
 
     @command.new(name=lambda self: self.prefix,
                  help='Manage RT tickets', require_subcommand=True)
@@ -205,64 +489,97 @@ class RT(Plugin):
 
     @rt.subcommand('properties', aliases=('p', 'prop'), help='Show all ticket properties.')
     @command.argument('number', 'ticket number', parser=str)
+    @labelled
     async def properties(self, evt: MessageEvent, number: str) -> None:
         if not self.can_manage(evt) or not self.valid_number(number):
             return
         await evt.mark_read()
         properties_dict = await self._properties(number)
         properties = '  \n'.join([f'{k}: {v}' for k, v in properties_dict.items()])
-        await evt.respond(f'{self.markdown_link(number)} properties:  \n{properties}'
-                          f'  \n{self.take_this}')
+        await self._respond(evt, f'{self.markdown_link(number)} properties:  \n{properties}'
+                                 f'  \n{self.take_this}', number)
 
-    @rt.subcommand('resolve', aliases=('r', 'res'), help='Mark the ticket as resolved.')
-    @command.argument('number', 'ticket number', parser=str)
-    async def resolve(self, evt: MessageEvent, number: str) -> None:
-        if not self.can_manage(evt) or not self.valid_number(number):
+    @rt.subcommand('resolve', aliases=('r', 'res'), help='Mark the tickets as resolved.')
+    @command.argument('numbers', 'ticket numbers or ranges', pass_raw=True)
+    @labelled
+    async def resolve(self, evt: MessageEvent, numbers: str) -> None:
+        if not self.can_manage(evt):
             return
         await evt.mark_read()
-        await self._edit(number, {'Status': 'resolved'})
-        await evt.respond(f'{self.markdown_link(number)} resolved 😃 {self.take_this}')
-
-    @rt.subcommand('open', aliases=('o', 'op'), help='Mark the ticket as open.')
-    @command.argument('number', 'ticket number', parser=str)
-    async def open(self, evt: MessageEvent, number: str) -> None:
-        if not self.can_manage(evt) or not self.valid_number(number):
+        tickets = await self._ticket_numbers(evt, numbers)
+        if not tickets:
+            return
+        if await self._edit_all(evt, tickets, {'Status': 'resolved'}, 'resolved'):
+            number = tickets[0]
+            await self._respond(evt, f'{self.markdown_link(number)} resolved 😃 {self.take_this}',
+                                number)
+
+    @rt.subcommand('open', aliases=('o', 'op'), help='Mark the tickets as open.')
+    @command.argument('numbers', 'ticket numbers or ranges', pass_raw=True)
+    @labelled
+    async def open(self, evt: MessageEvent, numbers: str) -> None:
+        if not self.can_manage(evt):
             return
         await evt.mark_read()
-        await self._edit(number, {'Status': 'open'})
-        await evt.respond(f'{self.markdown_link(number)} opened 😐️ {self.take_this}')
-
-    @rt.subcommand('stall', aliases=('st', 'sta'), help='Mark the ticket as stalled.')
-    @command.argument('number', 'ticket number', parser=str)
-    async def stall(self, evt: MessageEvent, number: str) -> None:
-        if not self.can_manage(evt) or not self.valid_number(number):
+        tickets = await self._ticket_numbers(evt, numbers)
+        if not tickets:
+            return
+        if await self._edit_all(evt, tickets, {'Status': 'open'}, 'opened'):
+            number = tickets[0]
+            await self._respond(evt, f'{self.markdown_link(number)} opened 😐️ {self.take_this}',
+                                number)
+
+    @rt.subcommand('stall', aliases=('st', 'sta'), help='Mark the tickets as stalled.')
+    @command.argument('numbers', 'ticket numbers or ranges', pass_raw=True)
+    @labelled
+    async def stall(self, evt: MessageEvent, numbers: str) -> None:
+        if not self.can_manage(evt):
             return
         await evt.mark_read()
-        await self._edit(number, {'Status': 'stalled'})
-        await evt.respond(f'{self.markdown_link(number)} stalled 😴 {self.take_this}')
-
-    @rt.subcommand('delete', aliases=('d', 'del'), help='Mark the ticket as deleted.')
-    @command.argument('number', 'ticket number', parser=str)
-    async def delete(self, evt: MessageEvent, number: str) -> None:
-        if not self.can_manage(evt) or not self.valid_number(number):
+        tickets = await self._ticket_numbers(evt, numbers)
+        if not tickets:
+            return
+        if await self._edit_all(evt, tickets, {'Status': 'stalled'}, 'stalled'):
+            number = tickets[0]
+            await self._respond(evt, f'{self.markdown_link(number)} stalled 😴 {self.take_this}',
+                                number)
+
+    @rt.subcommand('delete', aliases=('d', 'del'), help='Mark the tickets as deleted.')
+    @command.argument('numbers', 'ticket numbers or ranges', pass_raw=True)
+    @labelled
+    async def delete(self, evt: MessageEvent, numbers: str) -> None:
+        if not self.can_manage(evt):
             return
         await evt.mark_read()
-        await self._edit(number, {'Status': 'deleted'})
-        await evt.respond(f'{self.markdown_link(number)} deleted 🤬 {self.take_this}')
-
-    @rt.subcommand('queue', aliases=('q', 'que'), help='Put the ticket in queue.')
-    @command.argument('number', 'ticket number', parser=str)
-    @command.argument('qid', 'queue id', parser=str)
-    async def queue(self, evt: MessageEvent, number: str, qid: str) -> None:
-        if not self.can_manage(evt) or not self.valid_number(number):
+        tickets = await self._ticket_numbers(evt, numbers)
+        if not tickets:
+            return
+        if await self._edit_all(evt, tickets, {'Status': 'deleted'}, 'deleted'):
+            number = tickets[0]
+            await self._respond(evt, f'{self.markdown_link(number)} deleted 🤬 {self.take_this}',
+                                number)
+
+    @rt.subcommand('queue', aliases=('q', 'que'), help='Put the tickets in queue.')
+    @command.argument('numbers', 'ticket numbers or ranges, then the queue id', pass_raw=True)
+    @labelled
+    async def queue(self, evt: MessageEvent, numbers: str) -> None:
+        numbers, _, qid = numbers.strip().rpartition(' ')
+        if not self.can_manage(evt):
             return
         await evt.mark_read()
-        await self._edit(number, {'Status': 'open', 'Queue': qid})
-        await evt.respond(f'{self.markdown_link(number)} queued in **{qid}** 😐️ {self.take_this}')
+        tickets = await self._ticket_numbers(evt, numbers)
+        if not tickets:
+            return
+        if await self._edit_all(evt, tickets, {'Status': 'open', 'Queue': qid},
+                                f'queued in **{qid}**'):
+            number = tickets[0]
+            await self._respond(evt, f'{self.markdown_link(number)} queued in **{qid}** 😐️ '
+                                     f'{self.take_this}', number)
 
     @rt.subcommand('comment', aliases=('c', 'com'), help='Add a comment.')
     @command.argument('number', 'ticket number', parser=str)
     @command.argument('text', 'comment text', pass_raw=True)
+    @labelled
     async def comment(self, evt: MessageEvent, number: str, text: str) -> None:
         if not self.can_manage(evt) or not self.valid_number(number):
             return
@@ -274,11 +591,12 @@ class RT(Plugin):
             body=f'{displayname} commented 🤓 on {number} {self.take_this}',
             formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
             f'commented 🤓 on <code>{number}</code> {self.take_this}')
-        await evt.respond(content)
+        await self._respond(evt, content)
 
     @rt.subcommand('reply', aliases=('re', 'rep'), help='Reply to requestor(s).')
     @command.argument('number', 'ticket number', parser=str)
     @command.argument('text', 'reply text', pass_raw=True)
+    @labelled
     async def reply(self, evt: MessageEvent, number: str, text: str) -> None:
         if not self.can_manage(evt) or not self.valid_number(number):
             return
@@ -290,32 +608,37 @@ class RT(Plugin):
             body=f'{displayname} replied 📨 to {number} {self.take_this}',
             formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
             f'replied 📨 to <code>{number}</code> {self.take_this}')
-        await evt.respond(content)
+        await self._respond(evt, content)
 
     @rt.subcommand('history', aliases=('h', 'hist'), help='Get a list of all history entries.')
     @command.argument('number', 'ticket number', parser=str)
+    @labelled
     async def history(self, evt: MessageEvent, number: str) -> None:
         if not self.can_manage(evt) or not self.valid_number(number):
             return
         await evt.mark_read()
-        history_dict = await self._history(number)
-        history = '  \n'.join([f'{k}: {v}' for k, v in history_dict.items()])
-        await evt.respond(f'{self.markdown_link(number)} history entries:  \n{history}')
+        history = await self._history(number)
+        lines = [(f'{k}: {v}', f'{k}: {html.escape(v)}') for k, v in history.items()]
+        await self._page(evt, self._listing((f'rt#{number} history entries',
+                                             f'{self.html_link(number)} history entries'),
+                                            lines))
 
     @rt.subcommand('entry', aliases=('e', 'ent'), help='Gets a single history entry.')
     @command.argument('number', 'ticket number', parser=str)
     @command.argument('entryid', 'entry number', parser=str)
+    @labelled
     async def entry(self, evt: MessageEvent, number: str, entryid: str) -> None:
         if not self.can_manage(evt) or not self.valid_number(number):
             return
         await evt.mark_read()
         entry_dict = await self._entry(number, entryid)
         entry = '  \n'.join([f'{k}: {v}' for k, v in entry_dict.items()])
-        await evt.respond(f'{self.markdown_link(number)} history entry {entryid}:  \n{entry}'
-                          f'  \n{self.take_this}')
+        await self._respond(evt, f'{self.markdown_link(number)} history entry {entryid}:  \n'
+                                 f'{entry}  \n{self.take_this}', number)
 
     @rt.subcommand('last', aliases=('l', 'la'), help='Gets the last entry.')
     @command.argument('number', 'ticket number', parser=str)
+    @labelled
     async def last(self, evt: MessageEvent, number: str) -> None:
         if not self.can_manage(evt) or not self.valid_number(number):
             return
@@ -325,103 +648,136 @@ class RT(Plugin):
         entryid = max(mails, key=int)
         entry_dict = await self._entry(number, entryid)
         entry = '  \n'.join([f'{k}: {v}' for k, v in entry_dict.items()])
-        await evt.respond(f'{self.markdown_link(number)} history entry {entryid}:  \n{entry}'
-                          f'  \n{self.take_this}')
+        await self._respond(evt, f'{self.markdown_link(number)} history entry {entryid}:  \n'
+                                 f'{entry}  \n{self.take_this}', number)
 
     @rt.subcommand('show', aliases=('s', 'sh'), help='Show all information about the ticket.')
     @command.argument('number', 'ticket number', parser=str)
+    @labelled
     async def show(self, evt: MessageEvent, number: str) -> None:
         if not self.can_manage(evt) or not self.valid_number(number):
             return
         await evt.mark_read()
-        prop_dict = await self._properties(number)
+        start = time.monotonic()
+        ticket = await self._fresh_ticket(number)
+        prop_dict = self.filter_dict(ticket, self.filter_properties)
+        history = await self._history(number, ticket)
         props = '  \n'.join([f'{k}: {v}' for k, v in prop_dict.items()])
-        await evt.respond(f'{self.markdown_link(number)} properties:  \n{props}')
-        history = await self._history(number)
-        for entryid, entry_text in history.items():
-            if any(i in entry_text for i in self.interesting + ['Requestor']):
-                if 'Requestor' in entry_text:
-                    await evt.respond(f'history entry {entryid}: {entry_text}')
-                    continue
-                entry_dict = await self._entry(number, entryid)
-                entry = '  \n'.join([f'{k}: {v}' for k, v in entry_dict.items()])
-                await evt.respond(f'history entry {entryid}:  \n{entry}')
-
-    @rt.subcommand('take', aliases=('t', 'ta', 'steal'), help='Take or steal the ticket.')
-    @command.argument('number', 'ticket number', parser=str)
-    async def take(self, evt: MessageEvent, number: str) -> None:
-        if not self.can_manage(evt) or not self.valid_number(number):
+        parts = [f'{self.markdown_link(number)} properties:  \n{props}']
+        selected = [(k, v) for k, v in history.items()
+                    if any(i in v for i in self.interesting + ['Requestor'])]
+        entryids = [k for k, v in selected if 'Requestor' not in v]
+        entries = await gather_bounded([self._entry(number, k) for k in entryids],
+                                       self.concurrency)
+        entry_dicts = dict(zip(entryids, entries))
+        for entryid, entry_text in selected:
+            if 'Requestor' in entry_text:
+                parts.append(f'history entry {entryid}: {entry_text}')
+                continue
+            entry_dict = entry_dicts[entryid]
+            if isinstance(entry_dict, Exception):
+                self.log.warning(f'Failed to fetch rt#{number} entry {entryid}: {entry_dict!r}')
+                parts.append(f'history entry {entryid} could not be fetched 😵')
+                continue
+            entry = '  \n'.join([f'{k}: {v}' for k, v in entry_dict.items()])
+            parts.append(f'history entry {entryid}:  \n{entry}')
+        elapsed = time.monotonic() - start
+        parts.append(f'_{len(entryids)} history entries fetched in {elapsed:.2f}s_')
+        for message in pack(parts, self.message_size):
+            await self._respond(evt, message)
+
+    @rt.subcommand('take', aliases=('t', 'ta', 'steal'), help='Take or steal the tickets.')
+    @command.argument('numbers', 'ticket numbers or ranges', pass_raw=True)
+    @labelled
+    async def take(self, evt: MessageEvent, numbers: str) -> None:
+        if not self.can_manage(evt):
             return
         await evt.mark_read()
+        tickets = await self._ticket_numbers(evt, numbers)
+        if not tickets:
+            return
         displayname = await self._displayname(evt.room_id, evt.sender)
         username = evt.sender[1:].split(':')[0]
-        await self._edit(number, {'Owner': self.map_user(username)})
-        content = TextMessageEventContent(
-            msgtype=MessageType.NOTICE, format=Format.HTML,
-            body=f'{displayname} took rt#{number} 👍️',
-            formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
-            f'took {self.html_link(number)} 👍️')
-        await evt.respond(content)
+        if await self._edit_all(evt, tickets, {'Owner': self.map_user(username)},
+                                f'taken by {displayname}'):
+            number = tickets[0]
+            content = TextMessageEventContent(
+                msgtype=MessageType.NOTICE, format=Format.HTML,
+                body=f'{displayname} took rt#{number} 👍️',
+                formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
+                f'took {self.html_link(number)} 👍️')
+            await self._respond(evt, content, number)
 
-    @rt.subcommand('disown', aliases=('di', 'dis'), help='Disown a ticket.')
-    @command.argument('number', 'ticket number', parser=str)
-    async def take(self, evt: MessageEvent, number: str) -> None:
-        if not self.can_manage(evt) or not self.valid_number(number):
+    @rt.subcommand('disown', aliases=('di', 'dis'), help='Disown the tickets.')
+    @command.argument('numbers', 'ticket numbers or ranges', pass_raw=True)
+    @labelled
+    async def disown(self, evt: MessageEvent, numbers: str) -> None:
+        if not self.can_manage(evt):
             return
         await evt.mark_read()
+        tickets = await self._ticket_numbers(evt, numbers)
+        if not tickets:
+            return
         displayname = await self._displayname(evt.room_id, evt.sender)
-        await self._edit(number, {'Owner': 'Nobody'})
-        content = TextMessageEventContent(
-            msgtype=MessageType.NOTICE, format=Format.HTML,
-            body=f'{displayname} disowned rt#{number} 👎️',
-            formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
-            f'disowned {self.html_link(number)} 👎️')
-        await evt.respond(content)
-
-    @rt.subcommand('give', aliases=('g', 'gi', 'assign'), help='Give the ticket to somebody.')
-    @command.argument('number', 'ticket number', parser=str)
-    @command.argument('user', 'matrix user', parser=str)
-    async def give(self, evt: MessageEvent, number: str, user: str) -> None:
-        if not self.can_manage(evt) or not self.valid_number(number):
+        if await self._edit_all(evt, tickets, {'Owner': 'Nobody'},
+                                f'disowned by {displayname}'):
+            number = tickets[0]
+            content = TextMessageEventContent(
+                msgtype=MessageType.NOTICE, format=Format.HTML,
+                body=f'{displayname} disowned rt#{number} 👎️',
+                formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
+                f'disowned {self.html_link(number)} 👎️')
+            await self._respond(evt, content, number)
+
+    @rt.subcommand('give', aliases=('g', 'gi', 'assign'), help='Give the tickets to somebody.')
+    @command.argument('numbers', 'ticket numbers or ranges, then the matrix user', pass_raw=True)
+    @labelled
+    async def give(self, evt: MessageEvent, numbers: str) -> None:
+        numbers, _, user = numbers.strip().rpartition(' ')
+        if not self.can_manage(evt):
             return
         await evt.mark_read()
-        member_mxids = await self._member_mxids(evt.room_id)
-        if user[0] == '@':
-            if ':' in user:
-                user = {v: k for k, v in member_mxids.items()}[user]
-            else:
-                user = user[1:]
-        if user not in member_mxids.keys() and user not in member_mxids.values():
-            await evt.respond(f'hmm... **{user}** is not the in room 🤔')
+        tickets = await self._ticket_numbers(evt, numbers)
+        if not tickets:
             return
+        members = await self.members.room(evt.room_id)
+        if user[0] == '@' and ':' not in user:
+            user = user[1:]
+        target_mxid = members.lookup(user)
+        if target_mxid is None:
+            await self._respond(evt, f'hmm... **{user}** is not the in room 🤔')
+            return
+        user = members.names[target_mxid]
         displayname = await self._displayname(evt.room_id, evt.sender)
-        target_mxid = member_mxids[user]
         target_username = target_mxid[1:].split(':')[0]
-        await self._edit(number, {'Owner': self.map_user(target_username)})
-        react = f'(\U0001F44D to accept, \U0001F595 to reject)'
-        content = TextMessageEventContent(
-            msgtype=MessageType.NOTICE, format=Format.HTML,
-            body=f'{displayname} assigned rt#{number} to {user} 😜 {react}',
-            formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
-            f'assigned {self.html_link(number)} to '
-            f'<a href="https://matrix.to/#/{target_mxid}">{target_mxid}</a> 😜 {react}')
-        await evt.respond(content)
+        if await self._edit_all(evt, tickets, {'Owner': self.map_user(target_username)},
+                                f'assigned to {user}'):
+            number = tickets[0]
+            react = f'(\U0001F44D to accept, \U0001F595 to reject)'
+            content = TextMessageEventContent(
+                msgtype=MessageType.NOTICE, format=Format.HTML,
+                body=f'{displayname} assigned rt#{number} to {user} 😜 {react}',
+                formatted_body=f'<a href="https://matrix.to/#/{evt.sender}">{evt.sender}</a> '
+                f'assigned {self.html_link(number)} to '
+                f'<a href="https://matrix.to/#/{target_mxid}">{target_mxid}</a> 😜 {react}')
+            await self._respond(evt, content, number, evt.sender)
 
     @rt.subcommand('new', aliases=('n', 'new'), help='List all unowned new/open tickets.')
+    @labelled
     async def new(self, evt: MessageEvent) -> None:
         if not self.can_manage(evt):
             return
         await evt.mark_read()
-        params = {'query': 'Owner = "Nobody" AND ( Status = "new" OR Status = "open" )'}
-        tickets_dict = await self._search(params)
-        links = {k: f'[{v}]({self.display}?id={k})' for k, v in tickets_dict.items()}
-        tickets = '  \n'.join([f'`{k}`: {links[k]}' for k, v in tickets_dict.items()])
-        if tickets:
-            await evt.respond(f'Unowned open tickets:  \n{tickets}')
+        query = 'Owner = "Nobody" AND ( Status = "new" OR Status = "open" )'
+        tickets_dict = await self._search(query)
+        if tickets_dict:
+            title = ('Unowned open tickets', 'Unowned open tickets')
+            await self._page(evt, self._ticket_listing(title, tickets_dict))
         else:
-            await evt.respond('All done ✅')
+            await self._respond(evt, 'All done ✅')
 
     @rt.subcommand('mine', aliases=('m', 'my'), help='List all your open tickets.')
+    @labelled
     async def mine(self, evt: MessageEvent) -> None:
         if not self.can_manage(evt):
             return
@@ -429,41 +785,124 @@ class RT(Plugin):
         displayname = await self._displayname(evt.room_id, evt.sender)
         username = evt.sender[1:].split(':')[0]
         mapped_username = self.map_user(username)
-        params = {'query': f'Owner = "{mapped_username}" AND ( Status = "new" OR Status = "open" )'}
-        tickets_dict = await self._search(params)
-        links = {k: f'<a href="{self.display}?id={k}">{v}</a>' for k, v in tickets_dict.items()}
+        query = f'Owner = "{mapped_username}" AND ( Status = "new" OR Status = "open" )'
+        tickets_dict = await self._search(query)
         if tickets_dict:
-            body = '\n'.join([f'{k}: {v}' for k, v in tickets_dict.items()])
-            fbody = '<br/>'.join([f'<code>{k}</code>: {links[k]}' for k, v in tickets_dict.items()])
-            content = TextMessageEventContent(
-                msgtype=MessageType.NOTICE, format=Format.HTML,
-                body=f'Open tickets for {displayname}:\n{body}',
-                formatted_body=f'Open tickets for <a href="https://matrix.to/#/{evt.sender}">'
-                f'{evt.sender}</a>:<br/>{fbody}')
-            await evt.respond(content)
+            title = (f'Open tickets for {displayname}',
+                     f'Open tickets for <a href="https://matrix.to/#/{evt.sender}">'
+                     f'{evt.sender}</a>')
+            await self._page(evt, self._ticket_listing(title, tickets_dict))
         else:
-            await evt.respond('All done 🤙')
+            await self._respond(evt, 'All done 🤙')
 
     @rt.subcommand('unsolved', aliases=('u', 'un'), help='List all open tickets.')
+    @labelled
     async def unsolved(self, evt: MessageEvent) -> None:
         if not self.can_manage(evt):
             return
         await evt.mark_read()
-        params = {'query': f'Status = "new" OR Status = "open"'}
-        tickets_dict = await self._search(params)
-        links = {k: f'<a href="{self.display}?id={k}">{v}</a>' for k, v in tickets_dict.items()}
+        query = 'Status = "new" OR Status = "open"'
+        tickets_dict = await self._search(query)
         if tickets_dict:
-            body = '\n'.join([f'{k}: {v}' for k, v in tickets_dict.items()])
-            fbody = '<br/>'.join([f'<code>{k}</code>: {links[k]}' for k, v in tickets_dict.items()])
-            content = TextMessageEventContent(
-                msgtype=MessageType.NOTICE, format=Format.HTML,
-                body=f'Open tickets:\n{body}',
-                formatted_body=f'Open tickets:<br/>{fbody}')
-            await evt.respond(content)
+            title = ('Open tickets', 'Open tickets')
+            await self._page(evt, self._ticket_listing(title, tickets_dict))
         else:
-            await evt.respond('All done ✅')
+            await self._respond(evt, 'All done ✅')
+
+    @rt.subcommand('more', aliases=('mo',), help='Show the next page of the last listing.')
+    @labelled
+    async def more(self, evt: MessageEvent) -> None:
+        if not self.can_manage(evt):
+            return
+        await evt.mark_read()
+        listing = self.cursors.get(evt.room_id)
+        if listing is None:
+            await self._respond(evt, 'Nothing more to show 🤷')
+            return
+        await self._page(evt, listing)
+
+    @rt.subcommand('find', aliases=('f', 'fi'), help='Find tickets in the local ticket index.')
+    @command.argument('text', 'words to look for', pass_raw=True)
+    @labelled
+    async def find(self, evt: MessageEvent, text: str) -> None:
+        if not self.can_manage(evt) or not text.strip() or self.index.maxsize <= 0:
+            return
+        await evt.mark_read()
+        if not self.index.built:
+            await self._respond(evt, 'The ticket index is not ready yet, try again later ⏳')
+            return
+        tickets = dict(self.index.find(text))
+        if tickets:
+            title = (f'Tickets matching "{text}"', f'Tickets matching "{html.escape(text)}"')
+            await self._page(evt, self._ticket_listing(title, tickets))
+        else:
+            await self._respond(evt, 'Nothing found 🤷')
+
+    def _gauges(self) -> Dict[str, float]:
+        session = self.backend.stats()
+        cache = self.tickets.stats()
+        history = self.history_store.stats()
+        flights = self.flights.stats()
+        messages = self.messages.stats()
+        scheduler = self.scheduler.stats()
+        cursors = self.cursors.stats()
+        index = self.index.stats()
+        return {
+            'rt_requests_total': session['requests'],
+            'rt_logins_total': session['logins'],
+            'rt_reused_session_total': session['reused'],
+            'ticket_cache_entries': cache['size'],
+            'ticket_cache_hits_total': cache['hits'],
+            'ticket_cache_misses_total': cache['misses'],
+            'history_cache_tickets': history['tickets'],
+            'history_cache_entries': history['entries'],
+            'history_cache_hits_total': history['hits'],
+            'history_cache_misses_total': history['misses'],
+            'rt_inflight': flights['inflight'],
+            'rt_collapsed_total': flights['collapsed'],
+            'rt_active': scheduler['active'],
+            'rt_waiting': scheduler['waiting'],
+            'rt_timeouts_total': scheduler['timeouts'],
+            'rt_rejected_total': scheduler['rejected'],
+            'rt_breaker_open': scheduler['breaker_open'],
+            'rt_breaker_opened_total': scheduler['breaker_opened'],
+            'message_index_entries': messages['size'],
+            'message_index_hits_total': messages['hits'],
+            'message_index_misses_total': messages['misses'],
+            'listing_cursors': cursors['size'],
+            'ticket_index_entries': index['size'],
+            'ticket_index_words': index['words'],
+            'ticket_index_refreshes_total': index['refreshes'],
+            'ticket_index_lookups_total': index['lookups'],
+        }
+
+    @rt.subcommand('stats', help='Show RT, Matrix and cache statistics (admins only).')
+    @labelled
+    async def stats(self, evt: MessageEvent) -> None:
+        if not self.can_admin(evt):
+            return
+        await evt.mark_read()
+        gauges = '\n'.join(f'{k}: {v}' for k, v in self._gauges().items())
+        sections = [('RT requests', self.metrics.summary('rt')),
+                    ('Matrix requests', self.metrics.summary('matrix')),
+                    ('Commands', self.metrics.summary('command'))]
+        parts = [f'**{title}**\n```\n{table(rows)}\n```' for title, rows in sections]
+        parts.append(f'**Sessions and caches**\n```\n{gauges}\n```')
+        for message in pack(parts, self.message_size):
+            await self._respond(evt, message)
+
+    @web.get('/metrics')
+    async def prometheus(self, request: Request) -> Response:
+        if not self.metrics_token:
+            return Response(status=404)
+        given = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(given.encode(), f'Bearer {self.metrics_token}'.encode()):
+            return Response(status=401, headers={'WWW-Authenticate': 'Bearer'})
+        return Response(text=self.metrics.prometheus(gauges=self._gauges()),
+                        content_type='text/plain', charset='utf-8')
 
     @rt.subcommand('autoresolve', help='Ask the bot to automatically answer and resolve tickets.')
+    @labelled
     async def autoresolve(self, evt: MessageEvent) -> None:
         if not self.can_manage(evt):
             return
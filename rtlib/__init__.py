@@ -0,0 +1,17 @@
+from .session import RTSession, RTAuthError
+from .backend import Backend, Rest1Backend
+from .rest2 import Rest2Backend
+from .cache import TTLCache
+from .errors import RTUnavailable
+from .scheduler import Scheduler, PrioritySlots, CircuitBreaker
+from .pipeline import gather_bounded
+from .flight import SingleFlight
+from .text import Listing, pack
+from .members import MemberIndex, RoomMembers
+from .parser import Parser, Record, Response, parse, parse_stream
+from .database import DatabaseWorker
+from .history import HistoryStore, TicketHistory
+from .messages import MessageIndex, SentMessage
+from .index import TicketIndex, IndexedTicket, index_fields
+from .watcher import QueueWatch, QueueWatcher
+from .metrics import Metrics, Histogram, labelled, command_label, table
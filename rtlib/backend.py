@@ -0,0 +1,112 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, Optional
+from .metrics import Metrics
+from .parser import Record
+from .scheduler import Scheduler
+from .session import RTSession
+
+Fields = Dict[str, str]
+
+
+class Backend(ABC):
+    """The RT operations the plugin uses.
+
+    Every backend returns tickets, history lists and history entries with the
+    field names and value formats of RT REST 1.0, so the plugin's output and
+    the ``filter_properties``/``filter_entry`` settings do not depend on it.
+    """
+
+    name = ''
+
+    @abstractmethod
+    def configure(self, url: str, user: str, password: str, token: str) -> None:
+        ...
+
+    @abstractmethod
+    async def show(self, number: str) -> Fields:
+        """The ticket's fields, empty if it does not exist."""
+
+    @abstractmethod
+    async def history(self, number: str) -> Fields:
+        """History entry ids mapped to their one-line descriptions."""
+
+    @abstractmethod
+    async def entry(self, number: str, entryid: str, content_limit: int = 0) -> Optional[Record]:
+        """One history entry, with ``Content`` cut after ``content_limit`` characters."""
+
+    @abstractmethod
+    async def search(self, query: str, fields: Iterable[str],
+                     orderby: str = '') -> Dict[str, Fields]:
+        """Ticket numbers mapped to the requested fields, in ``orderby`` order."""
+
+    @abstractmethod
+    async def edit(self, number: str, properties: Fields) -> Optional[str]:
+        """Change ticket fields; returns RT's error message, or None on success."""
+
+    @abstractmethod
+    async def comment(self, number: str, action: str, text: str) -> None:
+        """Add a comment (``action`` is ``comment``) or a reply (``correspond``)."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        ...
+
+    @abstractmethod
+    async def close(self) -> None:
+        ...
+
+
+class Rest1Backend(Backend):
+    """RT REST 1.0: text responses over a logged-in :class:`RTSession`."""
+
+    name = 'rest1'
+
+    def __init__(self, headers: dict, metrics: Metrics, scheduler: Scheduler) -> None:
+        self.session = RTSession(headers, metrics, scheduler)
+
+    def configure(self, url: str, user: str, password: str, token: str) -> None:
+        self.session.configure(f'{url}/REST/1.0/', user, password)
+
+    async def show(self, number: str) -> Fields:
+        response = await self.session.get(f'ticket/{number}/show', 'show')
+        return response.fields
+
+    async def history(self, number: str) -> Fields:
+        response = await self.session.get(f'ticket/{number}/history', 'history')
+        return response.fields
+
+    async def entry(self, number: str, entryid: str, content_limit: int = 0) -> Optional[Record]:
+        response = await self.session.get(f'ticket/{number}/history/id/{entryid}', 'entry',
+                                          content_limit=content_limit)
+        return response.records[0] if response.records else None
+
+    async def search(self, query: str, fields: Iterable[str],
+                     orderby: str = '') -> Dict[str, Fields]:
+        params = {'query': query, 'format': 'l', 'fields': ','.join(fields)}
+        if orderby:
+            params['orderby'] = orderby
+        response = await self.session.get('search/ticket', 'search', params=params)
+        tickets = {}
+        for record in response.records:
+            number = record.fields.get('id', '').rpartition('/')[2]
+            if number.isdigit():
+                tickets[number] = record.fields
+        return tickets
+
+    async def edit(self, number: str, properties: Fields) -> Optional[str]:
+        content = {'content': '\n'.join([f'{k}: {v}' for k, v in properties.items()])}
+        response = await self.session.post(f'ticket/{number}/edit', 'edit', data=content)
+        if response.ok and any(c.endswith(' updated.') for c in response.comments):
+            return None
+        return ' '.join(response.comments) or f'{response.status} {response.message}'
+
+    async def comment(self, number: str, action: str, text: str) -> None:
+        multiline_text = text.replace('\n', '\n ')
+        content = {'content': f'id: {number}\nAction: {action}\nText: {multiline_text}'}
+        await self.session.post(f'ticket/{number}/comment', 'comment', data=content)
+
+    def stats(self) -> Dict[str, int]:
+        return self.session.stats()
+
+    async def close(self) -> None:
+        await self.session.close()
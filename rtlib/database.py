@@ -0,0 +1,37 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Set
+from sqlalchemy.engine.base import Engine
+
+
+class DatabaseWorker:
+    """Runs the plugin's blocking database calls in one worker thread.
+
+    Calls run one at a time in the order they were made, so a write never
+    overtakes the table creation or an earlier write. ``run`` returns an
+    awaitable result; ``submit`` doesn't wait, and its failures are logged.
+    """
+
+    def __init__(self, engine: Engine, log) -> None:
+        self.engine = engine
+        self.log = log
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rt-database')
+        self._pending: Set[asyncio.Future] = set()
+
+    def run(self, call: Callable[..., Any], *args: Any) -> 'asyncio.Future[Any]':
+        return asyncio.get_event_loop().run_in_executor(self._executor, call, *args)
+
+    def submit(self, call: Callable[..., Any], *args: Any) -> None:
+        future = self.run(call, *args)
+        self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future: asyncio.Future) -> None:
+        self._pending.discard(future)
+        if not future.cancelled() and future.exception() is not None:
+            self.log.warning(f'Writing to the database failed: {future.exception()!r}')
+
+    async def close(self) -> None:
+        """Wait for the submitted calls and stop the worker."""
+        await asyncio.gather(*self._pending, return_exceptions=True)
+        self._executor.shutdown(wait=False)
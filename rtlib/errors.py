@@ -0,0 +1,2 @@
+class RTUnavailable(Exception):
+    """RT did not answer, or the circuit breaker keeps requests off it."""
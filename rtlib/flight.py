@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from .metrics import Metrics
+
+Key = Tuple[str, ...]
+
+
+class SingleFlight:
+    """Share one in-flight RT read between concurrent callers asking for the same key.
+
+    Keys are tuples starting with the RT call name and the ticket number, e.g.
+    ``('show', '123')`` or ``('entry', '123', '4567')``. The optional ``store``
+    callback caches the result; it is skipped when the key was forgotten while
+    the request was in flight, so a read that raced a write is never cached.
+    """
+
+    def __init__(self, metrics: Metrics) -> None:
+        self.metrics = metrics
+        self.calls = 0
+        self.collapsed = 0
+        self._flights: Dict[Key, asyncio.Future] = {}
+
+    async def do(self, key: Key, call: Callable[[], Awaitable[Any]],
+                 store: Optional[Callable[[Any], None]] = None) -> Any:
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._run(key, call, store))
+            flight.add_done_callback(lambda done: self._done(key, done))
+            self._flights[key] = flight
+            self.calls += 1
+        else:
+            self.collapsed += 1
+            self.metrics.collapse('rt', key[0])
+        return await asyncio.shield(flight)
+
+    async def _run(self, key: Key, call: Callable[[], Awaitable[Any]],
+                   store: Optional[Callable[[Any], None]]) -> Any:
+        result = await call()
+        if store is not None and self._flights.get(key) is asyncio.current_task():
+            store(result)
+        return result
+
+    def _done(self, key: Key, flight: asyncio.Future) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.cancelled():
+            # Retrieved here so a failure nobody is waiting for any more isn't logged.
+            flight.exception()
+
+    def forget(self, number: str) -> None:
+        """Detach the in-flight reads of a ticket; later callers start a fresh request."""
+        for key in [key for key in self._flights if key[1] == number]:
+            del self._flights[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {'inflight': len(self._flights), 'calls': self.calls,
+                'collapsed': self.collapsed}
@@ -0,0 +1,97 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class TicketHistory:
+    """The known history entry list of one ticket."""
+
+    def __init__(self) -> None:
+        self.entries: Dict[str, str] = {}
+        self.high = 0
+        self.updated: Optional[str] = None
+
+    def merge(self, entries: Dict[str, str], updated: Optional[str]) -> List[str]:
+        """Add the entries newer than the highest known id and return their ids."""
+        new = [k for k in entries if k.isdigit() and int(k) > self.high]
+        for entryid in new:
+            self.entries[entryid] = entries[entryid]
+            self.high = max(self.high, int(entryid))
+        self.updated = updated
+        return new
+
+
+class HistoryStore:
+    """Per-ticket history lists plus fetched entry bodies, both LRU bounded.
+
+    History entries never change once RT has written them, so an entry body
+    stays valid for as long as it is kept. Entry lists are bounded by the
+    number of tickets, entry bodies by their total size in characters.
+    """
+
+    def __init__(self, max_tickets: int, max_size: int) -> None:
+        self.max_tickets = max_tickets
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._tickets: OrderedDict = OrderedDict()
+        self._bodies: OrderedDict = OrderedDict()
+
+    def configure(self, max_tickets: int, max_size: int) -> None:
+        self.max_tickets = max_tickets
+        self.max_size = max_size
+        self._shrink()
+
+    def ticket(self, number: str) -> TicketHistory:
+        history = self._tickets.get(number)
+        if history is None:
+            history = self._tickets[number] = TicketHistory()
+        self._tickets.move_to_end(number)
+        self._shrink()
+        return history
+
+    def cached(self, number: str, updated: Optional[str]) -> Optional[TicketHistory]:
+        """Return the ticket's history if it was refreshed at the given LastUpdated."""
+        history = self._tickets.get(number)
+        if history is None or updated is None or history.updated != updated:
+            self.misses += 1
+            return None
+        self._tickets.move_to_end(number)
+        self.hits += 1
+        return history
+
+    def entry(self, number: str, entryid: str) -> Optional[dict]:
+        item = self._bodies.get((number, entryid))
+        if item is None:
+            return None
+        self._bodies.move_to_end((number, entryid))
+        return item[1]
+
+    def put_entry(self, number: str, entryid: str, entry: dict) -> None:
+        size = sum(len(k) + len(v) for k, v in entry.items())
+        if size > self.max_size:
+            return
+        self._drop_entry((number, entryid))
+        self._bodies[(number, entryid)] = (size, entry)
+        self.size += size
+        self._shrink()
+
+    def _drop_entry(self, key: Tuple[str, str]) -> None:
+        item = self._bodies.pop(key, None)
+        if item is not None:
+            self.size -= item[0]
+
+    def _shrink(self) -> None:
+        while len(self._tickets) > max(self.max_tickets, 0):
+            self._tickets.popitem(last=False)
+        while self._bodies and self.size > self.max_size:
+            self.size -= self._bodies.popitem(last=False)[1][0]
+
+    def clear(self) -> None:
+        self._tickets.clear()
+        self._bodies.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        return {'tickets': len(self._tickets), 'entries': len(self._bodies),
+                'size': self.size, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,317 @@
+import re
+import time
+import heapq
+import asyncio
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+from sqlalchemy import Column, DateTime, Float, Integer, MetaData, String, Table, Text, select
+from .database import DatabaseWorker
+from .watcher import Search, overlap, parse_date
+
+regex_word = re.compile(r'\w+')
+# Score of a query word found in each field; ids win over subjects over the rest
+weights = {'id': 8, 'Subject': 4, 'Queue': 2, 'Owner': 2, 'Requestors': 1}
+index_fields = ['Subject', 'Queue', 'Owner', 'Requestors', 'Status', 'LastUpdated']
+
+
+def words(text: str) -> List[str]:
+    return regex_word.findall(text.lower())
+
+
+class IndexedTicket(NamedTuple):
+    subject: str
+    queue: str
+    owner: str
+    requestors: str
+    status: str
+    updated: Optional[datetime]
+
+    def tokens(self, number: int) -> Dict[str, int]:
+        """Every word of the ticket with the weight of the best field it occurs in."""
+        tokens = {str(number): weights['id']}
+        for name, value in (('Subject', self.subject), ('Queue', self.queue),
+                            ('Owner', self.owner), ('Requestors', self.requestors)):
+            for word in words(value):
+                tokens[word] = max(tokens.get(word, 0), weights[name])
+        return tokens
+
+    def fields(self) -> Dict[str, str]:
+        return {'Subject': self.subject, 'Status': self.status, 'Queue': self.queue,
+                'Owner': self.owner}
+
+
+class TicketIndex:
+    """An inverted index over ticket ids, subjects, queues, owners and requestors.
+
+    It is built once by walking all tickets that are not deleted in id ranges
+    of ``build_chunk``, so no single search has to return the whole RT, and
+    then kept current every ``interval`` seconds with searches for tickets
+    updated since the previous search started, asked relative to RT's clock.
+    The build stops after ``build_gap`` empty ranges in a row; tickets created
+    later arrive with the updates. A failed build resumes where it stopped. Lookups never touch RT.
+    At most ``maxsize`` tickets are kept, the least recently updated go first.
+    When the plugin has a database, the indexed tickets are written to the
+    ``ticket_index`` table as they change, and a restart resumes from there
+    with a delta search instead of a full build. The table is read and written
+    by the database worker; the build waits for each range to be written.
+    """
+
+    build_query = 'Status != "deleted"'
+    build_chunk = 1000
+    build_gap = 10
+
+    def __init__(self, search: Search, log, maxsize: int, interval: float,
+                 database: Optional[DatabaseWorker] = None) -> None:
+        self.search = search
+        self.log = log
+        self.maxsize = maxsize
+        self.interval = interval
+        self.database = database
+        # time.time() when the last finished build or refresh started
+        self.refreshed: Optional[float] = None
+        self.built = False
+        self.refreshes = 0
+        self.lookups = 0
+        self._tickets: Dict[int, IndexedTicket] = {}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._vocabulary: Optional[List[str]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._build_next = 0
+        self._build_empty = 0
+        self._build_started = 0.0
+        self.table: Optional[Table] = None
+        self.loaded: Optional[asyncio.Future] = None
+        if database is not None:
+            metadata = MetaData()
+            self.table = Table('ticket_index', metadata,
+                               Column('number', Integer, primary_key=True, autoincrement=False),
+                               Column('subject', Text, nullable=False),
+                               Column('queue', String(255), nullable=False),
+                               Column('owner', String(255), nullable=False),
+                               Column('requestors', Text, nullable=False),
+                               Column('status', String(64), nullable=False),
+                               Column('updated', DateTime, nullable=True, index=True),
+                               # NULL until the build that wrote the row finished
+                               Column('indexed_at', Float, nullable=True))
+            self.loaded = asyncio.ensure_future(self._load(database.run(self._read, metadata)))
+
+    async def _load(self, reading: 'asyncio.Future[List]') -> None:
+        try:
+            rows = await reading
+        except Exception as e:
+            self.log.warning(f'Loading the ticket index failed: {e!r}')
+            return
+        if not rows:
+            return
+        self.refreshed = max(row.indexed_at for row in rows if row.indexed_at)
+        self.built = True
+        for row in reversed(rows):
+            self._add(row.number, IndexedTicket(row.subject, row.queue, row.owner,
+                                                row.requestors, row.status, row.updated))
+
+    def _read(self, metadata: MetaData) -> List:
+        metadata.create_all(self.database.engine)
+        t = self.table
+        rows = self.database.engine.execute(select([t]).order_by(t.c.updated.desc())
+                                            .limit(self.maxsize)).fetchall()
+        if not any(row.indexed_at for row in rows):
+            # An interrupted build starts over
+            self.database.engine.execute(t.delete())
+            return []
+        return rows
+
+    def configure(self, maxsize: int, interval: float) -> None:
+        self.maxsize = maxsize
+        self.interval = interval
+        removed = self._shrink()
+        if self.table is not None and removed:
+            self.database.submit(self._write, removed, [])
+        if (maxsize <= 0 or interval <= 0) and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def start(self) -> None:
+        if self.maxsize > 0 and self.interval > 0 and self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    def _query(self, now: float) -> str:
+        return f'LastUpdated > "{int(now - self.refreshed) + overlap} seconds ago"'
+
+    async def refresh(self) -> int:
+        """Build the index, or search RT for the tickets changed since the last
+        refresh; returns the number of tickets RT returned."""
+        if not self.built:
+            count = await self._build()
+        else:
+            started = time.time()
+            tickets = await self.search(self._query(started))
+            await self.update(tickets, started)
+            self.refreshed = started
+            count = len(tickets)
+        self.refreshes += 1
+        return count
+
+    async def _build(self) -> int:
+        if not self._build_next:
+            self._build_started = time.time()
+        count = 0
+        while self._build_empty < self.build_gap:
+            first = self._build_next
+            last = first + self.build_chunk
+            tickets = await self.search(f'{self.build_query} AND id > {first} AND id <= {last}')
+            await self.update(tickets)
+            count += len(tickets)
+            self._build_empty = 0 if tickets else self._build_empty + 1
+            self._build_next = last
+        if self.table is not None:
+            await self.database.run(self._finish_build, self._build_started)
+        # Tickets updated during the build come with the first refresh
+        self.refreshed = self._build_started
+        self.built = True
+        return count
+
+    def _finish_build(self, started: float) -> None:
+        t = self.table
+        self.database.engine.execute(t.update().where(t.c.indexed_at.is_(None))
+                                     .values(indexed_at=started))
+
+    async def _run(self) -> None:
+        if self.loaded is not None:
+            await self.loaded
+        delay = self.interval / 10
+        while True:
+            start = time.monotonic()
+            try:
+                await self.refresh()
+                slow = time.monotonic() - start > self.interval / 4
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log.warning(f'Refreshing the ticket index failed: {e!r}')
+                slow = True
+            if slow:
+                delay = min(delay * 2, self.interval * 8)
+            else:
+                delay = max(delay / 2, self.interval)
+            await asyncio.sleep(delay)
+
+    async def update(self, tickets: Dict[str, dict], indexed_at: Optional[float] = None) -> None:
+        """Index the given tickets and drop deleted ones."""
+        changed = []
+        removed = []
+        for number, ticket in tickets.items():
+            if not number.isdigit():
+                continue
+            number = int(number)
+            updated = parse_date(ticket.get('LastUpdated'))
+            self._remove(number)
+            if ticket.get('Status') == 'deleted':
+                removed.append(number)
+                continue
+            indexed = IndexedTicket(ticket.get('Subject', ''), ticket.get('Queue', ''),
+                                    ticket.get('Owner', ''), ticket.get('Requestors', ''),
+                                    ticket.get('Status', ''), updated)
+            self._add(number, indexed)
+            changed.append(number)
+        removed += self._shrink()
+        if self.table is not None and (changed or removed):
+            rows = [{'number': number, 'subject': ticket.subject, 'queue': ticket.queue,
+                     'owner': ticket.owner, 'requestors': ticket.requestors,
+                     'status': ticket.status, 'updated': ticket.updated,
+                     'indexed_at': indexed_at}
+                    for number, ticket in ((n, self._tickets.get(n)) for n in changed)
+                    if ticket is not None]
+            await self.database.run(self._write, changed + removed, rows)
+
+    def _add(self, number: int, ticket: IndexedTicket) -> None:
+        self._tickets[number] = ticket
+        for token, weight in ticket.tokens(number).items():
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = {}
+                self._vocabulary = None
+            postings[number] = weight
+
+    def _remove(self, number: int) -> None:
+        ticket = self._tickets.pop(number, None)
+        if ticket is None:
+            return
+        for token in ticket.tokens(number):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(number, None)
+            if not postings:
+                del self._postings[token]
+                self._vocabulary = None
+
+    def _shrink(self) -> List[int]:
+        """Drop the least recently updated tickets beyond ``maxsize``."""
+        excess = len(self._tickets) - max(self.maxsize, 0)
+        if excess <= 0:
+            return []
+        evicted = heapq.nsmallest(excess, self._tickets,
+                                  key=lambda n: (self._tickets[n].updated or datetime.min, n))
+        for number in evicted:
+            self._remove(number)
+        return evicted
+
+    def _write(self, numbers: List[int], rows: List[dict]) -> None:
+        """Replace the rows of ``numbers`` by ``rows``, in a single transaction."""
+        t = self.table
+        with self.database.engine.begin() as connection:
+            # Chunked, SQLite limits the number of bound parameters
+            for i in range(0, len(numbers), 500):
+                connection.execute(t.delete().where(t.c.number.in_(numbers[i:i + 500])))
+            if rows:
+                connection.execute(t.insert(), rows)
+
+    def _matches(self, word: str) -> Iterator[Tuple[str, bool]]:
+        """Indexed words equal to ``word`` or, from three letters on, starting with it."""
+        if word in self._postings:
+            yield word, True
+        if len(word) < 3:
+            return
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        vocabulary = self._vocabulary
+        for i in range(bisect_left(vocabulary, word), len(vocabulary)):
+            if not vocabulary[i].startswith(word):
+                break
+            if vocabulary[i] != word:
+                yield vocabulary[i], False
+
+    def find(self, text: str) -> List[Tuple[str, Dict[str, str]]]:
+        """Tickets containing every word of ``text``, best matches first.
+
+        A ticket scores the weight of the best field each word occurs in, half
+        of it for prefix matches. Ties go to the newer ticket.
+        """
+        self.lookups += 1
+        scores: Optional[Dict[int, float]] = None
+        for word in dict.fromkeys(words(text)):
+            found: Dict[int, float] = {}
+            for token, exact in self._matches(word):
+                for number, weight in self._postings[token].items():
+                    score = weight if exact else weight / 2
+                    if score > found.get(number, 0):
+                        found[number] = score
+            if scores is None:
+                scores = found
+            else:
+                scores = {n: s + found[n] for n, s in scores.items() if n in found}
+            if not scores:
+                return []
+        ranked = sorted((scores or {}).items(), key=lambda item: (-item[1], -item[0]))
+        return [(str(number), self._tickets[number].fields()) for number, _ in ranked]
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._tickets), 'words': len(self._postings),
+                'refreshes': self.refreshes, 'lookups': self.lookups}
@@ -0,0 +1,87 @@
+import asyncio
+from typing import Dict, Optional
+from mautrix.types import UserID, RoomID, EventType, Membership, StateEvent
+from .metrics import Metrics
+
+
+class RoomMembers:
+    """Joined members of one room, indexed by mxid and by displayname."""
+
+    def __init__(self) -> None:
+        self.names: Dict[UserID, str] = {}
+        self.mxids: Dict[str, UserID] = {}
+
+    def set(self, mxid: UserID, displayname: Optional[str]) -> None:
+        self.remove(mxid)
+        name = displayname or mxid
+        self.names[mxid] = name
+        self.mxids[name] = mxid
+
+    def remove(self, mxid: UserID) -> None:
+        name = self.names.pop(mxid, None)
+        if name is not None and self.mxids.get(name) == mxid:
+            del self.mxids[name]
+
+    def lookup(self, user: str) -> Optional[UserID]:
+        """Find a member by full mxid or by displayname."""
+        if user in self.names:
+            return UserID(user)
+        return self.mxids.get(user)
+
+
+class MemberIndex:
+    """Per-room membership index built from one ``joined_members`` call per room.
+
+    Rooms are kept up to date from ``m.room.member`` events and dropped when
+    the bot leaves them.
+    """
+
+    def __init__(self, client, metrics: Metrics) -> None:
+        self.client = client
+        self.metrics = metrics
+        self.rooms: Dict[RoomID, RoomMembers] = {}
+        self._loading: Dict[RoomID, asyncio.Future] = {}
+
+    async def room(self, room_id: RoomID) -> RoomMembers:
+        if room_id in self.rooms:
+            return self.rooms[room_id]
+        loading = self._loading.get(room_id)
+        if loading is None:
+            loading = self._loading[room_id] = asyncio.ensure_future(self._load(room_id))
+        return await asyncio.shield(loading)
+
+    async def _load(self, room_id: RoomID) -> RoomMembers:
+        try:
+            with self.metrics.time('matrix', 'get_joined_members'):
+                joined = await self.client.get_joined_members(room_id)
+        finally:
+            self._loading.pop(room_id, None)
+        members = RoomMembers()
+        for mxid, member in joined.items():
+            members.set(mxid, getattr(member, 'displayname', None))
+        self.rooms[room_id] = members
+        return members
+
+    async def displayname(self, room_id: RoomID, mxid: UserID) -> str:
+        members = await self.room(room_id)
+        if mxid in members.names:
+            return members.names[mxid]
+        # Not a joined member (anymore), so only the name is used
+        with self.metrics.time('matrix', 'get_state_event'):
+            event = await self.client.get_state_event(room_id, EventType.ROOM_MEMBER, mxid)
+        return event.displayname or mxid
+
+    def update(self, evt: StateEvent) -> None:
+        if evt.state_key == self.client.mxid and evt.content.membership != Membership.JOIN:
+            self.evict(evt.room_id)
+            return
+        members = self.rooms.get(evt.room_id)
+        if members is None:
+            return
+        if evt.content.membership == Membership.JOIN:
+            members.set(UserID(evt.state_key), evt.content.displayname)
+        else:
+            members.remove(UserID(evt.state_key))
+
+    def evict(self, room_id: RoomID) -> None:
+        self.rooms.pop(room_id, None)
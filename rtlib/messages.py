@@ -0,0 +1,112 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional
+from sqlalchemy import Column, Integer, MetaData, String, Table, select
+from mautrix.types import EventID, RoomID, UserID
+from .database import DatabaseWorker
+
+
+class SentMessage(NamedTuple):
+    number: str
+    room_id: RoomID
+    assigner: Optional[UserID]
+
+
+class MessageIndex:
+    """Maps the event IDs of the bot's ticket messages to the ticket they are about.
+
+    Reactions are resolved from here instead of fetching and re-parsing the
+    target event. The newest ``maxsize`` messages are kept in memory and, when
+    the plugin has a database, in the ``sent_message`` table so they survive
+    restarts. Both are trimmed back to ``maxsize`` in batches, once they are
+    ``slack`` (a fraction of ``maxsize``) over it. The table is read and
+    written by the database worker, so no reply waits for it.
+    """
+
+    slack = 0.1
+
+    def __init__(self, maxsize: int, database: Optional[DatabaseWorker] = None) -> None:
+        self.maxsize = maxsize
+        self.database = database
+        self.hits = 0
+        self.misses = 0
+        self._messages: OrderedDict = OrderedDict()
+        # Only used by the database worker
+        self._position = 0
+        self.table: Optional[Table] = None
+        self.loaded: Optional[asyncio.Future] = None
+        if database is not None:
+            metadata = MetaData()
+            self.table = Table('sent_message', metadata,
+                               Column('event_id', String(255), primary_key=True),
+                               Column('room_id', String(255), nullable=False),
+                               Column('number', String(32), nullable=False),
+                               Column('assigner', String(255), nullable=True),
+                               Column('position', Integer, nullable=False, index=True))
+            # Submitted first, before any write
+            self.loaded = asyncio.ensure_future(self._load(database.run(self._read, metadata)))
+
+    async def _load(self, reading: 'asyncio.Future[List]') -> None:
+        try:
+            rows = await reading
+        except Exception as e:
+            self.database.log.warning(f'Loading the sent messages failed: {e!r}')
+            return
+        # Messages sent while loading are newer than the stored ones
+        messages = OrderedDict((EventID(row.event_id), SentMessage(
+            row.number, RoomID(row.room_id), UserID(row.assigner) if row.assigner else None))
+            for row in reversed(rows))
+        messages.update(self._messages)
+        self._messages = messages
+        self._shrink()
+
+    def _read(self, metadata: MetaData) -> List:
+        metadata.create_all(self.database.engine)
+        t = self.table
+        rows = self.database.engine.execute(select([t]).order_by(t.c.position.desc())
+                                            .limit(self.maxsize)).fetchall()
+        self._position = max((row.position for row in rows), default=0)
+        return rows
+
+    def configure(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        self._shrink(0)
+
+    def get(self, event_id: EventID) -> Optional[SentMessage]:
+        message = self._messages.get(event_id)
+        if message is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return message
+
+    def add(self, event_id: EventID, room_id: RoomID, number: str,
+            assigner: Optional[UserID] = None) -> None:
+        self._messages[event_id] = SentMessage(number, room_id, assigner)
+        if self.table is not None:
+            self.database.submit(self._insert, event_id, room_id, number, assigner)
+        self._shrink()
+
+    def _insert(self, event_id: EventID, room_id: RoomID, number: str,
+                assigner: Optional[UserID]) -> None:
+        self._position += 1
+        self.database.engine.execute(self.table.insert().values(
+            event_id=event_id, room_id=room_id, number=number, assigner=assigner,
+            position=self._position))
+
+    def _shrink(self, slack: Optional[int] = None) -> None:
+        if slack is None:
+            slack = max(int(self.maxsize * self.slack), 1)
+        if len(self._messages) <= self.maxsize + slack:
+            return
+        while len(self._messages) > self.maxsize:
+            self._messages.popitem(last=False)
+        if self.table is not None:
+            self.database.submit(self._delete, self.maxsize)
+
+    def _delete(self, maxsize: int) -> None:
+        self.database.engine.execute(self.table.delete().where(
+            self.table.c.position <= self._position - maxsize))
+
+    def stats(self) -> Dict[str, int]:
+        return {'size': len(self._messages), 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,162 @@
+import time
+import functools
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+from .errors import RTUnavailable
+
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+command_label: ContextVar[str] = ContextVar('command_label', default='background')
+Key = Tuple[str, str, str]
+
+
+class Histogram:
+    """Latency histogram with the fixed ``buckets`` upper bounds (seconds)."""
+
+    __slots__ = ('counts', 'count', 'sum')
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def merge(self, other: 'Histogram') -> None:
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (inf past the last bucket)."""
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(buckets + (float('inf'),), self.counts):
+            cumulative += count
+            if cumulative >= rank and cumulative:
+                return bound
+        return 0.0
+
+
+class Timer:
+    __slots__ = ('metrics', 'key', 'start')
+
+    def __init__(self, metrics: 'Metrics', key: Key) -> None:
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self) -> 'Timer':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.metrics.observe(self.key, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics.errors[self.key] += 1
+
+
+class Metrics:
+    """Latency histograms and error/retry/collapsed counters keyed by (kind, call, command).
+
+    ``kind`` is ``rt``, ``matrix`` or ``command``; ``command`` is the subcommand
+    or handler the call was made for, taken from :data:`command_label`.
+    """
+
+    def __init__(self) -> None:
+        self.histograms: Dict[Key, Histogram] = {}
+        self.errors: Counter = Counter()
+        self.retries: Counter = Counter()
+        self.collapsed: Counter = Counter()
+
+    def time(self, kind: str, call: str) -> Timer:
+        return Timer(self, (kind, call, command_label.get()))
+
+    def observe(self, key: Key, seconds: float) -> None:
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+    def retry(self, kind: str, call: str) -> None:
+        self.retries[(kind, call, command_label.get())] += 1
+
+    def collapse(self, kind: str, call: str) -> None:
+        """Count a request that joined an identical one already in flight."""
+        self.collapsed[(kind, call, command_label.get())] += 1
+
+    def summary(self, kind: str, by: int = 1) -> List[Tuple[str, Histogram, int, int, int]]:
+        """Merge the histograms of one kind by call (by=1) or by command (by=2)."""
+        merged: Dict[str, list] = {}
+        for key, histogram in self.histograms.items():
+            if key[0] != kind:
+                continue
+            row = merged.setdefault(key[by], [Histogram(), 0, 0, 0])
+            row[0].merge(histogram)
+        for counter, column in ((self.errors, 1), (self.retries, 2), (self.collapsed, 3)):
+            for key, count in counter.items():
+                if key[0] == kind:
+                    merged.setdefault(key[by], [Histogram(), 0, 0, 0])[column] += count
+        return [(name, *row) for name, row in sorted(merged.items())]
+
+    def prometheus(self, prefix: str = 'maubot_rt',
+                   gauges: Optional[Dict[str, float]] = None) -> str:
+        lines = [f'# TYPE {prefix}_duration_seconds histogram']
+        for (kind, call, command), histogram in sorted(self.histograms.items()):
+            labels = f'kind="{kind}",call="{call}",command="{command}"'
+            cumulative = 0
+            for bound, count in zip(buckets, histogram.counts):
+                cumulative += count
+                lines.append(f'{prefix}_duration_seconds_bucket{{{labels},le="{bound}"}} '
+                             f'{cumulative}')
+            lines.append(f'{prefix}_duration_seconds_bucket{{{labels},le="+Inf"}} '
+                         f'{histogram.count}')
+            lines.append(f'{prefix}_duration_seconds_sum{{{labels}}} {histogram.sum}')
+            lines.append(f'{prefix}_duration_seconds_count{{{labels}}} {histogram.count}')
+        for name, counter in (('errors', self.errors), ('retries', self.retries),
+                              ('collapsed', self.collapsed)):
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            for (kind, call, command), count in sorted(counter.items()):
+                lines.append(f'{prefix}_{name}_total{{kind="{kind}",call="{call}",'
+                             f'command="{command}"}} {count}')
+        for name, value in (gauges or {}).items():
+            lines.append(f'{prefix}_{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def labelled(func):
+    """Label the RT and Matrix calls made by a handler with its name and time the handler.
+
+    If RT is unavailable the plugin's ``unavailable(evt, error)`` answers instead.
+    """
+    @functools.wraps(func)
+    async def wrapper(self, evt, *args, **kwargs):
+        token = command_label.set(func.__name__)
+        try:
+            with self.metrics.time('command', func.__name__):
+                return await func(self, evt, *args, **kwargs)
+        except RTUnavailable as error:
+            await self.unavailable(evt, error)
+        finally:
+            command_label.reset(token)
+    return wrapper
+
+
+def table(rows: Iterable[Tuple[str, Histogram, int, int, int]]) -> str:
+    lines = [f'{"":<20}{"count":>7}{"err":>5}{"retry":>6}{"shared":>7}'
+             f'{"p50":>8}{"p95":>8}{"p99":>8}']
+    for name, histogram, errors, retries, collapsed in rows:
+        p50, p95, p99 = (_format(histogram.quantile(q)) for q in (.5, .95, .99))
+        lines.append(f'{name:<20}{histogram.count:>7}{errors:>5}{retries:>6}{collapsed:>7}'
+                     f'{p50:>8}{p95:>8}{p99:>8}')
+    return '\n'.join(lines)
+
+
+def _format(seconds: float) -> str:
+    if seconds == float('inf'):
+        return f'>{buckets[-1]:g}s'
+    return f'{seconds * 1000:g}ms' if seconds < 1 else f'{seconds:g}s'
@@ -0,0 +1,157 @@
+import re
+import codecs
+from typing import AsyncIterable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+regex_status = re.compile(r'^RT/(\S+) (\d{3}) ?(.*)$')
+
+
+class Record(NamedTuple):
+    """One ``--`` separated record of an RT REST 1.0 response."""
+    fields: Dict[str, str]
+    comments: List[str]
+    truncated: Set[str]
+
+
+class Response(NamedTuple):
+    """A parsed RT REST 1.0 response: the status line and its records."""
+    version: str
+    status: int
+    message: str
+    records: List[Record]
+
+    @property
+    def ok(self) -> bool:
+        return self.status == 200
+
+    @property
+    def fields(self) -> Dict[str, str]:
+        return self.records[0].fields if self.records else {}
+
+    @property
+    def comments(self) -> List[str]:
+        return [comment for record in self.records for comment in record.comments]
+
+
+class Parser:
+    """Incremental line parser for the RT REST 1.0 text format.
+
+    Lines are fed one at a time, so a response never has to be held in memory
+    as a whole. Continuation lines (indented) are joined to the previous field
+    with their indentation removed, ``# ...`` lines are collected as comments
+    and ``--`` starts a new record. Values of the fields in ``capped`` are cut
+    at ``content_limit`` characters (0 disables the cap); the rest of such a
+    value is skipped as it arrives.
+    """
+
+    def __init__(self, content_limit: int = 0, capped: Iterable[str] = ('Content',)) -> None:
+        self.content_limit = content_limit
+        self.capped = set(capped)
+        self.version = ''
+        self.status = 0
+        self.message = ''
+        self.records: List[Record] = []
+        self._seen_status = False
+        self._new_record()
+
+    def _new_record(self) -> None:
+        self._fields: Dict[str, List[str]] = {}
+        self._sizes: Dict[str, int] = {}
+        self._comments: List[str] = []
+        self._truncated: Set[str] = set()
+        self._key: Optional[str] = None
+        self._indent = 0
+        self._blank = 0
+
+    def _finish_record(self) -> None:
+        if self._fields or self._comments:
+            fields = {k: '\n'.join(v) for k, v in self._fields.items()}
+            self.records.append(Record(fields, self._comments, self._truncated))
+        self._new_record()
+
+    def _append(self, key: str, value: str) -> None:
+        if self.content_limit and key in self.capped:
+            room = self.content_limit - self._sizes[key]
+            if len(value) + 1 > room:
+                value = value[:max(room - 1, 0)]
+                self._truncated.add(key)
+            self._sizes[key] += len(value) + 1
+        self._fields[key].append(value)
+
+    def feed(self, line: str) -> None:
+        if line[-1:] == '\r':
+            line = line[:-1]
+        first = line[:1]
+        key = self._key
+        if key is not None and (first == ' ' or first == '\t'):
+            if key in self._truncated:
+                return
+            for _ in range(self._blank):
+                self._append(key, '')
+            self._blank = 0
+            indent = len(line) - len(line.lstrip(' '))
+            self._append(key, line[min(indent, self._indent):])
+            return
+        if not self._seen_status:
+            if not line.strip():
+                return
+            self._seen_status = True
+            match = regex_status.match(line)
+            if match:
+                self.version, status, self.message = match.groups()
+                self.status = int(status)
+                return
+        if not line.strip():
+            if key is not None:
+                self._blank += 1
+            return
+        self._blank = 0
+        if line == '--':
+            self._finish_record()
+            return
+        if first == '#':
+            self._comments.append(line[1:].strip())
+            self._key = None
+            return
+        name, sep, value = line.partition(':')
+        if not sep or (value and value[0] != ' ') or first == ' ' or first == '\t':
+            if key is not None and key not in self._truncated:
+                self._append(key, line)
+            return
+        self._key = name
+        self._indent = len(name) + 2
+        self._fields[name] = []
+        self._sizes[name] = 0
+        self._truncated.discard(name)
+        self._append(name, value[1:])
+
+    def close(self) -> Response:
+        self._finish_record()
+        return Response(self.version, self.status, self.message, self.records)
+
+
+def parse(text: str, content_limit: int = 0) -> Response:
+    parser = Parser(content_limit)
+    for line in text.split('\n'):
+        parser.feed(line)
+    return parser.close()
+
+
+async def parse_stream(chunks: AsyncIterable[bytes], content_limit: int = 0,
+                       encoding: str = 'utf-8') -> Response:
+    """Parse a response from an iterable of byte chunks, e.g. ``response.content.iter_any()``."""
+    parser = Parser(content_limit)
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    pending: List[str] = []
+    async for chunk in chunks:
+        *lines, rest = decoder.decode(chunk).split('\n')
+        if lines:
+            lines[0] = ''.join(pending) + lines[0]
+            pending = []
+            for line in lines:
+                parser.feed(line)
+        if rest:
+            pending.append(rest)
+    pending.append(decoder.decode(b'', final=True))
+    if any(pending):
+        parser.feed(''.join(pending))
+    return parser.close()
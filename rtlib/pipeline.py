@@ -0,0 +1,17 @@
+import asyncio
+from typing import Awaitable, Iterable, List
+
+
+async def gather_bounded(aws: Iterable[Awaitable], limit: int) -> List:
+    """Await all awaitables with at most ``limit`` running at once.
+
+    Results are returned in input order; exceptions are returned in place of
+    the result instead of being raised.
+    """
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def run(aw: Awaitable):
+        async with semaphore:
+            return await aw
+
+    return await asyncio.gather(*[run(aw) for aw in aws], return_exceptions=True)
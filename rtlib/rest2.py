@@ -0,0 +1,246 @@
+import re
+import asyncio
+import base64
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+from aiohttp import ClientSession, TCPConnector
+from .backend import Backend, Fields
+from .metrics import Metrics
+from .parser import Record
+from .scheduler import Scheduler
+from .session import RTAuthError
+
+iso_format = '%Y-%m-%dT%H:%M:%SZ'
+ticket_date_format = '%a %b %d %H:%M:%S %Y'
+entry_date_format = '%Y-%m-%d %H:%M:%S'
+unset_date = '1970-01-01T00:00:00Z'
+no_content = 'This transaction appears to have no content'
+# REST 1.0 field names in the order ticket/show returns them
+ticket_fields = ['Queue', 'Owner', 'Creator', 'Subject', 'Status', 'Priority', 'InitialPriority',
+                 'FinalPriority', 'Requestors', 'Cc', 'AdminCc', 'Created', 'Starts', 'Started',
+                 'Due', 'Resolved', 'Told', 'LastUpdated', 'TimeEstimated', 'TimeWorked',
+                 'TimeLeft', 'CustomFields']
+entry_fields = ['Ticket', 'TimeTaken', 'Type', 'Field', 'OldValue', 'NewValue', 'Data',
+                'Description', 'Content', 'Creator', 'Created']
+renamed = {'Requestors': 'Requestor'}
+expanded = {'Queue': 'Name', 'Owner': 'Name', 'Creator': 'Name', 'Requestor': 'EmailAddress',
+            'Cc': 'EmailAddress', 'AdminCc': 'EmailAddress'}
+descriptions = {'Create': 'Ticket created', 'Correspond': 'Correspondence added',
+                'Comment': 'Comments added'}
+# The messages RT sends for the fields an update did change
+regex_updated = re.compile(r"changed from|set to|added|deleted|already the current value",
+                           re.IGNORECASE)
+
+
+def _date(value: str, fmt: str) -> str:
+    """Format a REST 2.0 timestamp like REST 1.0 does. The time stays in UTC:
+    REST 2.0 does not tell the user's time zone."""
+    if not value or value == unset_date:
+        return 'Not set'
+    try:
+        return datetime.strptime(value, iso_format).strftime(fmt)
+    except ValueError:
+        return value
+
+
+def _value(value: Any) -> str:
+    """Flatten a REST 2.0 value: linked records to their name, lists to a comma list."""
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return ', '.join(_value(item) for item in value)
+    if isinstance(value, dict):
+        return str(value.get('Name') or value.get('EmailAddress') or value.get('id', ''))
+    return str(value)
+
+
+def ticket(item: dict, fields: Iterable[str]) -> Fields:
+    """Convert a REST 2.0 ticket to REST 1.0 field names and formats."""
+    converted = {'id': f'ticket/{item.get("id")}'}
+    for name in fields:
+        if name == 'CustomFields':
+            for field in item.get('CustomFields') or []:
+                converted[f'CF.{{{field.get("name")}}}'] = ', '.join(field.get('values') or [])
+            continue
+        value = item.get(renamed.get(name, name))
+        if name in ('Created', 'Starts', 'Started', 'Due', 'Resolved', 'Told', 'LastUpdated'):
+            converted[name] = _date(value, ticket_date_format)
+        else:
+            converted[name] = _value(value)
+    return converted
+
+
+def describe(transaction: dict) -> str:
+    """The REST 1.0 one-line description of a transaction."""
+    kind = transaction.get('Type', '')
+    field = transaction.get('Field') or ''
+    old = _value(transaction.get('OldValue'))
+    new = _value(transaction.get('NewValue'))
+    if kind in descriptions:
+        text = descriptions[kind]
+    elif kind in ('Status', 'Set'):
+        text = f"{field or kind} changed from '{old}' to '{new}'"
+    elif kind == 'AddWatcher':
+        text = f'{field} {new} added'
+    elif kind == 'DelWatcher':
+        text = f'{field} {old} deleted'
+    else:
+        text = kind
+    return f'{text} by {_value(transaction.get("Creator"))}'
+
+
+class Rest2Backend(Backend):
+    """RT REST 2.0: JSON over token authentication.
+
+    Searches ask for exactly the fields the plugin shows and expand queues and
+    users to their names in the same request; pages after the first are
+    fetched concurrently. A history entry is its transaction plus its
+    attachments, fetched side by side.
+    """
+
+    name = 'rest2'
+    page_size = 100
+
+    def __init__(self, headers: dict, metrics: Metrics, scheduler: Scheduler) -> None:
+        self.headers = headers
+        self.metrics = metrics
+        self.scheduler = scheduler
+        self.rest = ''
+        self.host = ''
+        self.token = ''
+        self.http: Optional[ClientSession] = None
+        self.requests = 0
+
+    def configure(self, url: str, user: str, password: str, token: str) -> None:
+        self.rest = f'{url}/REST/2.0/'
+        self.host = urlparse(url).netloc
+        self.token = token
+
+    def _client(self) -> ClientSession:
+        if self.http is None or self.http.closed:
+            self.http = ClientSession(connector=TCPConnector(limit=0), headers=self.headers)
+        return self.http
+
+    async def _request(self, method: str, path: str, call: str,
+                       **kwargs) -> Tuple[int, Any]:
+        self.requests += 1
+        headers = {'Authorization': f'token {self.token}'}
+        with self.metrics.time('rt', call):
+            async with self._client().request(method, f'{self.rest}{path}', headers=headers,
+                                              **kwargs) as response:
+                if response.status >= 500:
+                    response.raise_for_status()
+                if response.status == 401:
+                    raise RTAuthError('RT rejected the REST 2.0 auth token')
+                if response.content_type != 'application/json':
+                    return response.status, {}
+                return response.status, await response.json() or {}
+
+    async def _call(self, method: str, path: str, call: str, **kwargs) -> Tuple[int, Any]:
+        return await self.scheduler.run(
+            self.host, call, lambda: self._request(method, path, call, **kwargs),
+            idempotent=method == 'GET')
+
+    async def _collection(self, path: str, call: str, params: Dict[str, str]) -> List[dict]:
+        params = {**params, 'per_page': str(self.page_size), 'page': '1'}
+        status, first = await self._call('GET', path, call, params=params)
+        if status != 200:
+            return []
+        items = list(first.get('items') or [])
+        pages = first.get('pages')
+        if pages:
+            others = await asyncio.gather(*(
+                self._call('GET', path, call, params={**params, 'page': str(page)})
+                for page in range(2, pages + 1)))
+            for _, body in others:
+                items += body.get('items') or []
+            return items
+        page = 1
+        while first.get('next_page'):
+            page += 1
+            _, first = await self._call('GET', path, call, params={**params, 'page': str(page)})
+            items += first.get('items') or []
+        return items
+
+    @staticmethod
+    def _fields(names: Iterable[str]) -> Dict[str, str]:
+        names = [renamed.get(name, name) for name in names if name != 'id']
+        params = {'fields': ','.join(names)}
+        params.update({f'fields[{name}]': expanded[name] for name in names if name in expanded})
+        return params
+
+    async def show(self, number: str) -> Fields:
+        params = {'query': f'id = {number}', **self._fields(ticket_fields)}
+        items = await self._collection('tickets', 'show', params)
+        return ticket(items[0], ticket_fields) if items else {}
+
+    async def history(self, number: str) -> Fields:
+        params = {'fields': 'Type,Field,OldValue,NewValue,Creator', 'fields[Creator]': 'Name'}
+        items = await self._collection(f'ticket/{number}/history', 'history', params)
+        return {str(item.get('id')): describe(item) for item in items}
+
+    async def entry(self, number: str, entryid: str, content_limit: int = 0) -> Optional[Record]:
+        (status, transaction), attachments = await asyncio.gather(
+            self._call('GET', f'transaction/{entryid}', 'entry'),
+            self._collection(f'transaction/{entryid}/attachments', 'attachments',
+                             {'fields': 'ContentType,Content'}))
+        if status != 200 or _value(transaction.get('Object')) != number:
+            return None
+        content = no_content
+        for attachment in attachments:
+            if attachment.get('ContentType') == 'text/plain' and attachment.get('Content'):
+                content = base64.b64decode(attachment['Content']).decode('utf-8', 'replace')
+                break
+        truncated = set()
+        if content_limit and len(content) > content_limit:
+            content = content[:content_limit]
+            truncated.add('Content')
+        fields = {'id': entryid}
+        for name in entry_fields:
+            if name == 'Ticket':
+                fields[name] = number
+            elif name == 'Description':
+                fields[name] = describe(transaction)
+            elif name == 'Content':
+                fields[name] = content
+            elif name == 'Created':
+                fields[name] = _date(transaction.get('Created'), entry_date_format)
+            else:
+                fields[name] = _value(transaction.get(name))
+        return Record(fields, [], truncated)
+
+    async def search(self, query: str, fields: Iterable[str],
+                     orderby: str = '') -> Dict[str, Fields]:
+        fields = list(fields)
+        params = {'query': query, **self._fields(fields)}
+        if orderby:
+            params['orderby'] = orderby.lstrip('+-')
+            params['order'] = 'DESC' if orderby.startswith('-') else 'ASC'
+        items = await self._collection('tickets', 'search', params)
+        return {str(item.get('id')): ticket(item, [f for f in fields if f != 'id'])
+                for item in items}
+
+    async def edit(self, number: str, properties: Fields) -> Optional[str]:
+        status, body = await self._call('PUT', f'ticket/{number}', 'edit', json=properties)
+        if status == 404:
+            return f'Ticket {number} does not exist.'
+        if status == 200 and isinstance(body, list):
+            # One message per field, refused changes included
+            errors = [str(message) for message in body if not regex_updated.search(str(message))]
+            return ' '.join(errors) or None
+        if status == 200:
+            return None
+        return _value(body.get('message')) if isinstance(body, dict) else _value(body)
+
+    async def comment(self, number: str, action: str, text: str) -> None:
+        await self._call('POST', f'ticket/{number}/{action}', 'comment',
+                         json={'Content': text, 'ContentType': 'text/plain'})
+
+    def stats(self) -> Dict[str, int]:
+        return {'logins': 0, 'requests': self.requests, 'reused': self.requests}
+
+    async def close(self) -> None:
+        if self.http is not None and not self.http.closed:
+            await self.http.close()
+        self.http = None
@@ -0,0 +1,197 @@
+import time
+import heapq
+import random
+import asyncio
+import itertools
+from typing import Awaitable, Callable, Dict, List, Tuple, TypeVar
+from aiohttp import ClientError
+from .errors import RTUnavailable
+from .metrics import Metrics, command_label
+
+T = TypeVar('T')
+INTERACTIVE = 0
+BACKGROUND = 1
+
+
+class PrioritySlots:
+    """A semaphore that wakes waiters in priority order, then first come first served."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = limit
+        self.active = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._order = itertools.count()
+
+    def configure(self, limit: int) -> None:
+        self.limit = limit
+        self._wake()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, waiter in self._waiters if not waiter.done())
+
+    async def acquire(self, priority: int) -> None:
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            return
+        waiter = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._order), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.active < self.limit:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if waiter.done():
+                continue
+            self.active += 1
+            waiter.set_result(None)
+
+
+class CircuitBreaker:
+    """Opens after ``threshold`` consecutive failures and lets one trial call
+    through every ``cooldown`` seconds until a call succeeds again."""
+
+    def __init__(self, threshold: int, cooldown: float,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened = 0
+        self.retry_at = 0.0
+        self._trial = False
+
+    @property
+    def open(self) -> bool:
+        return self.failures >= self.threshold > 0
+
+    def allow(self) -> bool:
+        if not self.open:
+            return True
+        if self._trial or self.clock() < self.retry_at:
+            return False
+        self._trial = True
+        return True
+
+    def success(self) -> None:
+        self.failures = 0
+        self._trial = False
+
+    def cancel(self) -> None:
+        """A call ended without telling whether RT is reachable."""
+        self._trial = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        self._trial = False
+        if self.open:
+            if self.failures == self.threshold:
+                self.opened += 1
+            self.retry_at = self.clock() + self.cooldown
+
+
+class Scheduler:
+    """Every RT request goes through here.
+
+    Requests wait for a global and a per-host slot; interactive commands are
+    served before background work (anything labelled ``background``, like the
+    queue watcher). Each attempt is bounded by ``timeout``. Idempotent requests
+    are retried after timeouts and connection errors with full-jitter
+    exponential backoff; the last failure is raised as :class:`RTUnavailable`.
+    Once ``breaker_threshold`` requests in a row have failed, calls fail fast
+    with :class:`RTUnavailable` until a trial request after ``breaker_cooldown``
+    seconds succeeds. Interactive and background requests have a breaker each,
+    so a slow background search cannot lock users out.
+    """
+
+    failures = (asyncio.TimeoutError, ClientError, OSError)
+
+    def __init__(self, metrics: Metrics, limit: int = 8, host_limit: int = 4,
+                 timeout: float = 15.0, retries: int = 2, backoff: float = 0.5,
+                 breaker_threshold: int = 5, breaker_cooldown: float = 30.0) -> None:
+        self.metrics = metrics
+        self.slots = PrioritySlots(limit)
+        self.host_limit = host_limit
+        self.hosts: Dict[str, PrioritySlots] = {}
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.breakers = {INTERACTIVE: CircuitBreaker(breaker_threshold, breaker_cooldown),
+                         BACKGROUND: CircuitBreaker(breaker_threshold, breaker_cooldown)}
+        self.rejected = 0
+        self.timeouts = 0
+
+    def configure(self, limit: int, host_limit: int, timeout: float, retries: int,
+                  backoff: float, breaker_threshold: int, breaker_cooldown: float) -> None:
+        self.slots.configure(limit)
+        self.host_limit = host_limit
+        for slots in self.hosts.values():
+            slots.configure(host_limit)
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        for breaker in self.breakers.values():
+            breaker.threshold = breaker_threshold
+            breaker.cooldown = breaker_cooldown
+
+    async def run(self, host: str, call: str, request: Callable[[], Awaitable[T]],
+                  idempotent: bool = False) -> T:
+        """Run ``request`` under the limits; ``call`` names it in the metrics."""
+        priority = BACKGROUND if command_label.get() == 'background' else INTERACTIVE
+        breaker = self.breakers[priority]
+        attempts = 1 + (self.retries if idempotent else 0)
+        for attempt in range(attempts):
+            if not breaker.allow():
+                self.rejected += 1
+                wait = max(0.0, breaker.retry_at - breaker.clock())
+                raise RTUnavailable(f'RT is unavailable, trying again in {wait:.0f}s')
+            try:
+                result = await self._attempt(host, priority, request)
+            except asyncio.CancelledError:
+                breaker.cancel()
+                raise
+            except self.failures as error:
+                breaker.failure()
+                if attempt + 1 >= attempts:
+                    raise RTUnavailable(f'RT is unavailable ({type(error).__name__})') from error
+                self.metrics.retry('rt', call)
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+                continue
+            except Exception:
+                # RT answered, just not with something the caller could use.
+                breaker.success()
+                raise
+            breaker.success()
+            return result
+
+    async def _attempt(self, host: str, priority: int, request: Callable[[], Awaitable[T]]) -> T:
+        host_slots = self.hosts.get(host)
+        if host_slots is None:
+            host_slots = self.hosts[host] = PrioritySlots(self.host_limit)
+        await self.slots.acquire(priority)
+        try:
+            await host_slots.acquire(priority)
+            try:
+                return await asyncio.wait_for(request(), self.timeout or None)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            finally:
+                host_slots.release()
+        finally:
+            self.slots.release()
+
+    def stats(self) -> Dict[str, int]:
+        return {'active': self.slots.active, 'waiting': self.slots.waiting,
+                'timeouts': self.timeouts, 'rejected': self.rejected,
+                'breaker_open': int(self.breakers[INTERACTIVE].open),
+                'breaker_opened': sum(b.opened for b in self.breakers.values())}
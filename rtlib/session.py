@@ -0,0 +1,127 @@
+import asyncio
+from typing import Optional
+from urllib.parse import urlparse
+from aiohttp import ClientSession, TCPConnector, CookieJar
+from .parser import Response, parse_stream
+from .metrics import Metrics
+from .scheduler import Scheduler
+
+
+class RTAuthError(Exception):
+    pass
+
+
+class RTSession:
+    """Logs in to RT REST 1.0 once and reuses the session cookie for every request.
+
+    RT answers an expired or missing session with a ``401 Credentials required``
+    status line in the response body, in which case the session logs in again
+    and retries the request once. Responses are parsed while they stream in.
+    Every request, including its login, runs through the :class:`Scheduler`.
+    """
+
+    def __init__(self, headers: dict, metrics: Metrics, scheduler: Scheduler) -> None:
+        self.headers = headers
+        self.metrics = metrics
+        self.scheduler = scheduler
+        self.rest = ''
+        self.host = ''
+        self.login = {}
+        self.http: Optional[ClientSession] = None
+        self.generation = 0
+        self.logged_in = False
+        self.logins = 0
+        self.requests = 0
+        self.reused = 0
+        self._lock = asyncio.Lock()
+
+    def configure(self, rest: str, user: str, password: str) -> None:
+        self.rest = rest
+        self.host = urlparse(rest).netloc
+        self.login = {'user': user, 'pass': password}
+        self.logged_in = False
+        if self.http is not None:
+            self.http.cookie_jar.clear()
+
+    def _client(self) -> ClientSession:
+        if self.http is None or self.http.closed:
+            # The scheduler limits concurrency, the connector just pools connections.
+            self.http = ClientSession(connector=TCPConnector(limit=0),
+                                      cookie_jar=CookieJar(unsafe=True),
+                                      headers=self.headers)
+        return self.http
+
+    async def _login(self) -> None:
+        async with self._lock:
+            if self.logged_in:
+                return
+            self._client().cookie_jar.clear()
+            with self.metrics.time('rt', 'login'):
+                async with self._client().post(self.rest, data=self.login) as response:
+                    self._check(response)
+                    parsed = await self._parse(response)
+            self.logins += 1
+            if parsed.status == 401:
+                self.logged_in = False
+                raise RTAuthError(f'RT login as {self.login.get("user")} failed')
+            self.generation += 1
+            self.logged_in = True
+
+    @staticmethod
+    def _check(response) -> None:
+        """Raise for proxy and server errors so the scheduler can retry them."""
+        if response.status >= 500:
+            response.raise_for_status()
+
+    @staticmethod
+    async def _parse(response, content_limit: int = 0) -> Response:
+        return await parse_stream(response.content.iter_chunked(65536), content_limit,
+                                  response.charset or 'utf-8')
+
+    async def request(self, method: str, path: str, call: str, content_limit: int = 0,
+                      **kwargs) -> Response:
+        """Send a request relative to the REST base URL and return the parsed response.
+
+        ``call`` names the request in the metrics, e.g. ``show`` or ``edit``.
+        GET requests are retried by the scheduler after timeouts and errors.
+        """
+        return await self.scheduler.run(
+            self.host, call, lambda: self._request(method, path, call, content_limit, **kwargs),
+            idempotent=method == 'GET')
+
+    async def _request(self, method: str, path: str, call: str, content_limit: int,
+                       **kwargs) -> Response:
+        url = f'{self.rest}{path}'
+        for attempt in range(2):
+            if not self.logged_in:
+                await self._login()
+            elif attempt == 0:
+                self.reused += 1
+            generation = self.generation
+            self.requests += 1
+            with self.metrics.time('rt', call):
+                async with self._client().request(method, url, **kwargs) as response:
+                    self._check(response)
+                    parsed = await self._parse(response, content_limit)
+            if attempt or parsed.status != 401:
+                return parsed
+            self.metrics.retry('rt', call)
+            if self.generation == generation:
+                self.logged_in = False
+        return parsed
+
+    async def get(self, path: str, call: str, params: dict = None,
+                  content_limit: int = 0) -> Response:
+        return await self.request('GET', path, call, content_limit, params=params)
+
+    async def post(self, path: str, call: str, data: dict = None) -> Response:
+        return await self.request('POST', path, call, data=data)
+
+    def stats(self) -> dict:
+        return {'logins': self.logins, 'requests': self.requests, 'reused': self.reused}
+
+    async def close(self) -> None:
+        if self.http is not None and not self.http.closed:
+            await self.http.close()
+        self.http = None
+        self.logged_in = False
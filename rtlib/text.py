@@ -0,0 +1,96 @@
+from typing import Iterable, List, Tuple
+
+
+def pack(parts: Iterable[str], limit: int, sep: str = '\n\n') -> List[str]:
+    """Join parts into as few messages as possible, each at most ``limit`` characters.
+
+    Parts are never reordered. A part longer than ``limit`` is split at line
+    boundaries, or hard-cut if a single line is still too long.
+    """
+    messages = []
+    current = ''
+    for part in parts:
+        for piece in _split(part, limit):
+            if current and len(current) + len(sep) + len(piece) > limit:
+                messages.append(current)
+                current = ''
+            current = f'{current}{sep}{piece}' if current else piece
+    if current:
+        messages.append(current)
+    return messages
+
+
+def _split(part: str, limit: int) -> List[str]:
+    if len(part) <= limit:
+        return [part]
+    pieces = []
+    current = ''
+    for line in part.split('\n'):
+        while len(line) > limit:
+            if current:
+                pieces.append(current)
+                current = ''
+            pieces.append(line[:limit])
+            line = line[limit:]
+        if current and len(current) + 1 + len(line) > limit:
+            pieces.append(current)
+            current = ''
+        current = f'{current}\n{line}' if current else line
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class Listing:
+    """A reply too long for one message, sent page by page.
+
+    Holds a title and the result lines as plain text and HTML pairs. Each
+    :meth:`page` takes the next lines that fit ``limit`` characters in both
+    bodies, and at most ``per_page`` lines if that is set. Pages that leave lines
+    behind end with a hint how to continue.
+    """
+
+    def __init__(self, title: Tuple[str, str], lines: List[Tuple[str, str]],
+                 hint: Tuple[str, str], per_page: int = 0) -> None:
+        self.title = title
+        self.lines = lines
+        self.hint = hint
+        self.per_page = per_page
+        self.position = 0
+        self.pages = 0
+
+    @property
+    def remaining(self) -> int:
+        return len(self.lines) - self.position
+
+    def _footer(self, remaining: int) -> Tuple[str, str]:
+        return (f'… and {remaining} more, {self.hint[0]} for the next page',
+                f'… and {remaining} more, {self.hint[1]} for the next page')
+
+    def page(self, limit: int) -> Tuple[str, str]:
+        """The next page as plain text and HTML."""
+        title, html_title = self.title
+        if self.pages:
+            title, html_title = f'{title} (continued)', f'{html_title} (continued)'
+        body, html = [f'{title}:'], [f'{html_title}:']
+        size, html_size = len(body[0]), len(html[0])
+        # Room for the footer, whichever number ends up in it
+        reserve = max(len(part) for part in self._footer(len(self.lines))) + 5
+        while self.position < len(self.lines):
+            if self.per_page and len(body) > self.per_page:
+                break
+            line, html_line = self.lines[self.position]
+            size += 1 + len(line)
+            html_size += 5 + len(html_line)
+            last = self.position + 1 == len(self.lines)
+            if len(body) > 1 and max(size, html_size) + (0 if last else reserve) > limit:
+                break
+            body.append(line)
+            html.append(html_line)
+            self.position += 1
+        self.pages += 1
+        if self.remaining:
+            footer, html_footer = self._footer(self.remaining)
+            body.append(footer)
+            html.append(html_footer)
+        return '\n'.join(body), '<br/>'.join(html)
@@ -0,0 +1,257 @@
+import time
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy import Column, DateTime, Float, MetaData, String, Table, Text, and_, select
+from .database import DatabaseWorker
+
+Search = Callable[[str], Awaitable[Dict[str, dict]]]
+Change = Tuple[str, dict, str]
+Announce = Callable[['QueueWatch', List[Change]], Awaitable[None]]
+
+date_formats = ('%a %b %d %H:%M:%S %Y', '%Y-%m-%d %H:%M:%S')
+active = {'new', 'open'}
+# How far back the first poll of a watch looks
+first_window = timedelta(days=1)
+# Seconds by which a poll overlaps the previous one, for clock skew
+overlap = 120
+
+
+def parse_date(value: Optional[str]) -> Optional[datetime]:
+    for fmt in date_formats:
+        try:
+            return datetime.strptime(value or '', fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class QueueWatch:
+    """State of one watched RT query, shared by every room that watches it.
+
+    Each poll asks RT for the tickets updated since the previous poll started,
+    as a time relative to RT's clock, so no date read from RT is ever sent
+    back in another time zone. The watermark is the newest LastUpdated value
+    seen so far; tickets created after it are new. If the first poll found
+    nothing, the start of its window is used instead, taken back from each
+    ticket's LastUpdated so it stays in the zone of RT's dates. ``seen``
+    remembers the last known status of each ticket (LRU bounded) so nothing is
+    announced twice. An active ticket that is not new is reopened if it was
+    last seen inactive, was resolved since the watermark, or was never seen
+    but has a Resolved date, i.e. it was resolved before the watch saw it.
+    """
+
+    def __init__(self, queue: str, query: str, seen_size: int = 10000) -> None:
+        self.queue = queue
+        self.query = query
+        self.rooms: Set[str] = set()
+        self.watermark: Optional[datetime] = None
+        self.polled: Optional[float] = None
+        # time.time() at the start of the first poll's window, if it found nothing
+        self.window: Optional[float] = None
+        self.seen: OrderedDict = OrderedDict()
+        self.seen_size = seen_size
+        self.interval = 0.0
+
+    def poll_query(self, now: float) -> str:
+        if self.polled is None:
+            ago = int(first_window.total_seconds())
+        else:
+            ago = int(now - self.polled) + overlap
+        return f'( {self.query} ) AND LastUpdated > "{ago} seconds ago"'
+
+    def _since(self, watermark: Optional[datetime], updated: Optional[datetime],
+               polled: float) -> Optional[datetime]:
+        if watermark is not None or self.window is None or updated is None:
+            return watermark
+        # A ticket in this poll was updated at about RT's now
+        return updated - timedelta(seconds=polled - self.window)
+
+    def update(self, tickets: Dict[str, dict], polled: float) -> List[Change]:
+        """Record the result of the poll started at ``polled`` (a ``time.time()``)
+        and return the tickets that are new or reopened."""
+        watermark = self.watermark
+        changes = []
+        for number, ticket in tickets.items():
+            status = ticket.get('Status', '')
+            created = parse_date(ticket.get('Created'))
+            updated = parse_date(ticket.get('LastUpdated'))
+            resolved = parse_date(ticket.get('Resolved'))
+            previous = self.seen.pop(number, None)
+            since = self._since(watermark, updated, polled)
+            if since is not None and status in active:
+                if previous is None and created and created >= since:
+                    changes.append((number, ticket, 'new'))
+                elif previous is None and resolved:
+                    changes.append((number, ticket, 'reopened'))
+                elif previous is not None and (previous not in active
+                                               or resolved and resolved >= since):
+                    changes.append((number, ticket, 'reopened'))
+            self.seen[number] = status
+            if updated and (self.watermark is None or updated > self.watermark):
+                self.watermark = updated
+        if self.watermark is None and self.polled is None:
+            self.window = polled - first_window.total_seconds()
+        self.polled = polled
+        return changes
+
+    def trim(self) -> List[str]:
+        """Forget the least recently seen tickets beyond ``seen_size``; returns them."""
+        dropped = []
+        while len(self.seen) > self.seen_size:
+            dropped.append(self.seen.popitem(last=False)[0])
+        return dropped
+
+
+class QueueWatcher:
+    """Polls every watched query in a background task and announces changes.
+
+    The poll interval starts at ``interval``; it doubles (up to
+    ``max_interval``) when a poll fails or takes more than a quarter of the
+    interval, and halves back towards ``interval`` after fast polls. When the
+    plugin has a database, the state of each watch is saved in the
+    ``queue_watch`` and ``queue_watch_seen`` tables after every poll, so a
+    restart picks up where it stopped and announces what changed meanwhile.
+    """
+
+    def __init__(self, search: Search, announce: Announce, log,
+                 database: Optional[DatabaseWorker] = None) -> None:
+        self.search = search
+        self.announce = announce
+        self.log = log
+        self.database = database
+        self.interval = 60.0
+        self.max_interval = 600.0
+        self.watches: Dict[str, QueueWatch] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._saved: Dict[str, Tuple[Any, List[Tuple[str, str]]]] = {}
+        self.loaded: Optional[asyncio.Future] = None
+        if database is not None:
+            metadata = MetaData()
+            self.state_table = Table('queue_watch', metadata,
+                                     Column('query', Text, primary_key=True),
+                                     Column('watermark', DateTime, nullable=True),
+                                     Column('polled', Float, nullable=True),
+                                     Column('window_start', Float, nullable=True))
+            self.seen_table = Table('queue_watch_seen', metadata,
+                                    Column('query', Text, primary_key=True),
+                                    Column('number', String(32), primary_key=True),
+                                    Column('status', String(64), nullable=False),
+                                    Column('seen_at', Float, nullable=False))
+            self.loaded = asyncio.ensure_future(self._load(database.run(self._read, metadata)))
+
+    async def _load(self, reading: 'asyncio.Future[Dict]') -> None:
+        try:
+            self._saved = await reading
+        except Exception as e:
+            self.log.warning(f'Loading the watched queues failed: {e!r}')
+
+    def _read(self, metadata: MetaData) -> Dict[str, Tuple[Any, List[Tuple[str, str]]]]:
+        metadata.create_all(self.database.engine)
+        s, t = self.state_table, self.seen_table
+        saved = {row.query: (row, []) for row in self.database.engine.execute(select([s]))}
+        for row in self.database.engine.execute(select([t]).order_by(t.c.seen_at)):
+            if row.query in saved:
+                saved[row.query][1].append((row.number, row.status))
+        return saved
+
+    def _restore(self, watch: QueueWatch) -> None:
+        saved = self._saved.pop(watch.query, None)
+        if saved is None or watch.polled is not None:
+            return
+        row, seen = saved
+        watch.watermark, watch.polled, watch.window = row.watermark, row.polled, row.window_start
+        watch.seen = OrderedDict(seen)
+        watch.trim()
+
+    def _save(self, query: str, watermark: Optional[datetime], polled: float,
+              window: Optional[float], seen: Dict[str, str], dropped: List[str]) -> None:
+        s, t = self.state_table, self.seen_table
+        numbers = list(seen) + dropped
+        with self.database.engine.begin() as connection:
+            connection.execute(s.delete().where(s.c.query == query))
+            connection.execute(s.insert().values(query=query, watermark=watermark,
+                                                 polled=polled, window_start=window))
+            # Chunked, SQLite limits the number of bound parameters
+            for i in range(0, len(numbers), 500):
+                connection.execute(t.delete().where(and_(t.c.query == query,
+                                                         t.c.number.in_(numbers[i:i + 500]))))
+            if seen:
+                connection.execute(t.insert(), [{'query': query, 'number': number,
+                                                 'status': status, 'seen_at': polled}
+                                                for number, status in seen.items()])
+
+    def _forget(self, query: str) -> None:
+        s, t = self.state_table, self.seen_table
+        with self.database.engine.begin() as connection:
+            connection.execute(s.delete().where(s.c.query == query))
+            connection.execute(t.delete().where(t.c.query == query))
+
+    def configure(self, watches: Iterable[dict], interval: float, max_interval: float) -> None:
+        self.interval = interval
+        self.max_interval = max(max_interval, interval)
+        configured: Dict[str, QueueWatch] = {}
+        for item in watches:
+            query = f'Queue = "{item["queue"]}"'
+            if item.get('query'):
+                query = f'{query} AND ( {item["query"]} )'
+            if query not in configured:
+                watch = self.watches.get(query) or QueueWatch(item['queue'], query)
+                watch.rooms = set()
+                configured[query] = watch
+            configured[query].rooms.add(item['room'])
+        if self.database is not None:
+            for query in self.watches.keys() - configured.keys():
+                self.database.submit(self._forget, query)
+        self.watches = configured
+
+    def start(self) -> None:
+        for query, task in list(self._tasks.items()):
+            if query not in self.watches:
+                task.cancel()
+                del self._tasks[query]
+        for query, watch in self.watches.items():
+            if query not in self._tasks:
+                self._tasks[query] = asyncio.ensure_future(self._run(watch))
+
+    async def stop(self) -> None:
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def poll(self, watch: QueueWatch) -> List[Change]:
+        started = time.time()
+        tickets = await self.search(watch.poll_query(started))
+        changes = watch.update(tickets, started)
+        dropped = watch.trim()
+        if self.database is not None:
+            seen = {number: watch.seen[number] for number in tickets if number in watch.seen}
+            self.database.submit(self._save, watch.query, watch.watermark, watch.polled,
+                                 watch.window, seen, dropped)
+        if changes and watch.rooms:
+            await self.announce(watch, changes)
+        return changes
+
+    async def _run(self, watch: QueueWatch) -> None:
+        if self.loaded is not None:
+            await self.loaded
+            self._restore(watch)
+        watch.interval = self.interval
+        while True:
+            start = time.monotonic()
+            try:
+                await self.poll(watch)
+                slow = time.monotonic() - start > watch.interval / 4
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.log.warning(f'Polling {watch.query} failed: {e!r}')
+                slow = True
+            if slow:
+                watch.interval = min(watch.interval * 2, self.max_interval)
+            else:
+                watch.interval = max(watch.interval / 2, self.interval)
+            await asyncio.sleep(watch.interval)